@@ -0,0 +1,264 @@
+import argparse
+import csv
+import os
+import random
+from collections import deque
+from datetime import datetime, timedelta
+from itertools import islice
+
+trading212_columns = [
+    "Action",
+    "Time",
+    "ISIN",
+    "Ticker",
+    "Name",
+    "No. of shares",
+    "Price / share",
+    "Currency (Price / share)",
+    "Exchange rate",
+    "Result",
+    "Currency (Result)",
+    "Total",
+    "Currency (Total)",
+    "Withholding tax",
+    "Currency (Withholding tax)",
+    "Currency conversion fee",
+    "Currency (Currency conversion fee)",
+    "Notes",
+    "ID",
+]
+nutmeg_investment_columns = [
+    "Date",
+    "Investment",
+    "Description",
+    "Share Price",
+    "No. Shares",
+    "Total Value",
+    "Pot",
+]
+nutmeg_transaction_columns = ["Date", "Description", "Amount", "Pot"]
+
+# Ticker, price currency and rough price in that currency
+instruments = {
+    "USD": [
+        ("AAPL", 150.0),
+        ("MRNA", 120.0),
+        ("GME", 25.0),
+        ("TSLA", 220.0),
+        ("KODK", 5.0),
+    ],
+    "GBP": [("VUSA", 70.0), ("VWRL", 95.0), ("ISF", 7.5)],
+    "GBX": [("BP", 480.0), ("LLOY", 45.0), ("TSCO", 260.0), ("VOD", 75.0)],
+    "EUR": [("ASML", 600.0), ("SAP", 130.0)],
+}
+gbp_per_unit = {"USD": 0.8, "GBP": 1.0, "GBX": 0.01, "EUR": 0.86}
+
+trading212_actions = [
+    ("Market buy", 45),
+    ("Market sell", 20),
+    ("Deposit", 10),
+    ("Withdrawal", 3),
+    ("Dividend (Ordinary)", 12),
+    ("Interest on cash", 10),
+]
+nutmeg_investment_descriptions = ["Purchase", "Sale", "Dividend"]
+nutmeg_transaction_descriptions = ["Monthly deposit", "Deposit", "Withdrawal", "Fee"]
+nutmeg_funds = ["UESD", "GIL5", "DHYG", "JPSG", "VUSA", "IUKD"]
+
+default_currency_mix = {"USD": 0.5, "GBP": 0.2, "GBX": 0.25, "EUR": 0.05}
+
+
+def parse_size(value):
+    # Accepts 10k, 1M, 10M style row counts
+    multipliers = {"k": 1_000, "m": 1_000_000}
+    suffix = value[-1].lower()
+    if suffix in multipliers:
+        return int(float(value[:-1]) * multipliers[suffix])
+    return int(value)
+
+
+def parse_mix(value):
+    # "USD=0.5,GBX=0.5"
+    mix = {}
+    for part in value.split(","):
+        currency, weight = part.split("=")
+        mix[currency.upper()] = float(weight)
+    return mix
+
+
+def trading212_rows(count, currency_mix, rng):
+    actions = [action for action, _ in trading212_actions]
+    action_weights = [weight for _, weight in trading212_actions]
+    currencies = list(currency_mix)
+    currency_weights = list(currency_mix.values())
+    time = datetime(2015, 1, 1, 8, 0, 0)
+    # Spread the rows over roughly ten years whatever the row count
+    average_gap = max(1, 10 * 365 * 24 * 3600 // max(count, 1))
+
+    for index in range(count):
+        time += timedelta(seconds=rng.randint(1, 2 * average_gap))
+        action = rng.choices(actions, action_weights)[0]
+        timestamp = time.strftime("%Y-%m-%d %H:%M:%S")
+        if rng.random() < 0.3:
+            timestamp += f".{rng.randint(0, 999):03}"
+
+        if action in ("Market buy", "Market sell", "Dividend (Ordinary)"):
+            currency = rng.choices(currencies, currency_weights)[0]
+            ticker, price = rng.choice(instruments[currency])
+            price = round(price * rng.uniform(0.7, 1.3), 2)
+            shares = round(rng.uniform(0.01, 25), 7)
+            rate = 1.0
+            if currency not in ("GBP", "GBX"):
+                rate = round(rng.uniform(0.95, 1.05) / gbp_per_unit[currency], 5)
+            total = round(shares * price * gbp_per_unit[currency], 2)
+            fee = ""
+            if currency in ("USD", "EUR") and action != "Dividend (Ordinary)":
+                fee = round(total * 0.0015, 2)
+            if action == "Dividend (Ordinary)":
+                total = round(total * 0.01, 2)
+            yield [
+                action,
+                timestamp,
+                f"XX{index:010}",
+                ticker,
+                ticker,
+                shares,
+                price,
+                currency,
+                rate,
+                "",
+                "GBP",
+                total,
+                "GBP",
+                "",
+                "",
+                fee,
+                "GBP" if fee != "" else "",
+                "",
+                f"EOF{index}",
+            ]
+        else:
+            total = round(rng.uniform(1, 2000), 2)
+            yield [action, timestamp] + [""] * 9 + [total, "GBP"] + [""] * 6
+
+
+def write_trading212(output_folder, rows, count, files, dupe_ratio):
+    # Rows are split into date ordered exports, each one repeating the tail of
+    # the previous export like overlapping downloads from the Trading212 app.
+    # Only that tail is kept in memory, so 10M row histories can be generated.
+    per_file = max(1, count // files)
+    overlap = int(count * dupe_ratio / (files - 1)) if files > 1 else 0
+    tail = deque(maxlen=overlap or None)
+    paths = []
+    for number in range(files):
+        file_rows = count - number * per_file if number == files - 1 else per_file
+        path = os.path.join(output_folder, f"TRADING212_{number:03}.csv")
+        with open(path, "w", newline="") as csvfile:
+            writer = csv.writer(csvfile)
+            writer.writerow(trading212_columns)
+            if overlap:
+                writer.writerows(tail)
+            for row in islice(rows, file_rows):
+                writer.writerow(row)
+                if overlap:
+                    tail.append(row)
+        paths.append(path)
+    return paths
+
+
+def write_nutmeg(output_folder, count, rng):
+    date = datetime(2015, 1, 1)
+    average_gap = max(1, 10 * 365 * 24 * 3600 // max(count, 1))
+    investments = os.path.join(output_folder, "NUTMEG_Investments.csv")
+    transactions = os.path.join(output_folder, "NUTMEG_Transactions.csv")
+    with open(investments, "w", newline="") as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerow(nutmeg_investment_columns)
+        for _ in range(count):
+            date += timedelta(seconds=rng.randint(0, 2 * average_gap))
+            shares = round(rng.uniform(0.1, 50), 4)
+            price = round(rng.uniform(1, 120), 4)
+            writer.writerow(
+                [
+                    date.strftime("%d-%b-%y"),
+                    rng.choice(nutmeg_funds),
+                    rng.choice(nutmeg_investment_descriptions),
+                    price,
+                    shares,
+                    round(shares * price, 2),
+                    "Pot 1",
+                ]
+            )
+
+    date = datetime(2015, 1, 1)
+    with open(transactions, "w", newline="") as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerow(nutmeg_transaction_columns)
+        for _ in range(max(1, count // 4)):
+            date += timedelta(seconds=rng.randint(0, 8 * average_gap))
+            writer.writerow(
+                [
+                    date.strftime("%d-%b-%y"),
+                    rng.choice(nutmeg_transaction_descriptions),
+                    round(rng.uniform(1, 1000), 2),
+                    "Pot 1",
+                ]
+            )
+    return [investments, transactions]
+
+
+def generate(
+    output_folder,
+    rows,
+    files=12,
+    dupe_ratio=0.05,
+    currency_mix=None,
+    nutmeg_ratio=0.2,
+    seed=1,
+):
+    # Writes rows unique Trading212 rows (plus rows * dupe_ratio repeated ones)
+    # and rows * nutmeg_ratio Nutmeg investment rows into output_folder
+    rng = random.Random(seed)
+    os.makedirs(output_folder, exist_ok=True)
+    currency_mix = currency_mix or default_currency_mix
+    paths = write_trading212(
+        output_folder,
+        trading212_rows(rows, currency_mix, rng),
+        rows,
+        files,
+        dupe_ratio,
+    )
+    if nutmeg_ratio:
+        paths += write_nutmeg(output_folder, int(rows * nutmeg_ratio), rng)
+    return paths
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Generate synthetic Trading212 and Nutmeg exports"
+    )
+    parser.add_argument("output_folder")
+    parser.add_argument(
+        "--rows", type=parse_size, default="100k", help="e.g. 10k, 1M"
+    )
+    parser.add_argument(
+        "--files", type=int, default=12, help="Trading212 exports to split into"
+    )
+    parser.add_argument("--dupe-ratio", type=float, default=0.05)
+    parser.add_argument(
+        "--currency-mix", type=parse_mix, default=None, help="e.g. USD=0.5,GBX=0.5"
+    )
+    parser.add_argument("--nutmeg-ratio", type=float, default=0.2)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    for path in generate(
+        args.output_folder,
+        args.rows,
+        args.files,
+        args.dupe_ratio,
+        args.currency_mix,
+        args.nutmeg_ratio,
+        args.seed,
+    ):
+        print(path)
@@ -0,0 +1,121 @@
+import argparse
+import asyncio
+import json
+import random
+import time
+
+import numpy as np
+
+default_paths = [
+    "/transactions?limit=100",
+    "/transactions?action=BUY,SELL&limit=500",
+    "/transactions?start=2023-01-01&end=2023-07-01&limit=1000",
+    "/holdings",
+    "/holdings?as_of=2023-06-30",
+    "/cash",
+]
+
+
+async def read_response(reader):
+    head = await reader.readuntil(b"\r\n\r\n")
+    lines = head.decode("latin-1").split("\r\n")
+    status = int(lines[0].split(" ")[1])
+    headers = {}
+    for line in lines[1:]:
+        name, _, value = line.partition(":")
+        if name:
+            headers[name.strip().lower()] = value.strip()
+    if headers.get("transfer-encoding") == "chunked":
+        size = 0
+        while True:
+            length = int(await reader.readuntil(b"\r\n"), 16)
+            await reader.readexactly(length + 2)
+            size += length
+            if not length:
+                break
+        return status, size
+    body = await reader.readexactly(int(headers.get("content-length", 0)))
+    return status, len(body)
+
+
+async def client(host, port, paths, deadline, latencies, errors):
+    # One keep-alive connection sending requests back to back
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        while time.perf_counter() < deadline:
+            path = random.choice(paths)
+            start = time.perf_counter()
+            writer.write(f"GET {path} HTTP/1.1\r\nHost: {host}\r\n\r\n".encode())
+            status, _ = await read_response(reader)
+            latencies.setdefault(path, []).append(time.perf_counter() - start)
+            if status != 200:
+                errors.append((path, status))
+    finally:
+        writer.close()
+
+
+async def load_test(host, port, paths, concurrency, seconds):
+    latencies = {}
+    errors = []
+    deadline = time.perf_counter() + seconds
+    started = time.perf_counter()
+    await asyncio.gather(
+        *[
+            client(host, port, paths, deadline, latencies, errors)
+            for _ in range(concurrency)
+        ]
+    )
+    return latencies, errors, time.perf_counter() - started
+
+
+def percentiles(values):
+    milliseconds = np.array(values) * 1000
+    return {
+        "requests": len(values),
+        "p50_ms": round(float(np.percentile(milliseconds, 50)), 2),
+        "p99_ms": round(float(np.percentile(milliseconds, 99)), 2),
+        "max_ms": round(float(milliseconds.max()), 2),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Measure server.py latency under concurrent requests"
+    )
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8212)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument(
+        "--path", action="append", help="request path to include (repeatable)"
+    )
+    parser.add_argument("--output", help="also write the results to this JSON file")
+    args = parser.parse_args()
+
+    latencies, errors, elapsed = asyncio.run(
+        load_test(
+            args.host,
+            args.port,
+            args.path or default_paths,
+            args.concurrency,
+            args.seconds,
+        )
+    )
+    all_latencies = [value for values in latencies.values() for value in values]
+    results = {
+        "concurrency": args.concurrency,
+        "seconds": round(elapsed, 2),
+        "requests_per_second": round(len(all_latencies) / elapsed),
+        "errors": len(errors),
+        "overall": percentiles(all_latencies),
+        "paths": {path: percentiles(values) for path, values in latencies.items()},
+    }
+    for path, stats in [("overall", results["overall"]), *results["paths"].items()]:
+        print(
+            f"{path:<60} {stats['requests']:>7} requests"
+            f" p50 {stats['p50_ms']:>8.2f} ms p99 {stats['p99_ms']:>8.2f} ms"
+        )
+    print(f"{results['requests_per_second']} requests/s, {len(errors)} errors")
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
@@ -0,0 +1,257 @@
+import argparse
+import json
+import os
+import platform
+import resource
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import brokers
+import trading212
+from benchmarks.generate import generate, parse_size
+from dedupe import dedupe_table
+from transaction_table import TransactionTable
+from writers import trading212_target, write_targets, yahoo_target
+
+default_sizes = ["10k", "100k", "1M"]
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes on Linux
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def status_mb(field):
+    # A memory field of /proc/self/status (VmRSS, VmHWM, ...) in MB
+    with open("/proc/self/status") as file:
+        for line in file:
+            if line.startswith(field + ":"):
+                return int(line.split()[1]) / 1024
+    return None
+
+
+def reset_peak_rss():
+    # Linux resets the process's high-water mark to its current RSS when 5 is
+    # written to clear_refs; elsewhere the peak can't be reset
+    try:
+        with open("/proc/self/clear_refs", "w") as file:
+            file.write("5")
+    except OSError:
+        return False
+    return True
+
+
+def stage_memory(function, *args):
+    # Runs a stage and returns its result and how far it raised memory use
+    # above the RSS it started with. ru_maxrss only ever grows, so where the
+    # peak can't be reset this is the increase over the peak of the earlier
+    # stages, and a stage staying below it reports 0.
+    if reset_peak_rss():
+        before = status_mb("VmRSS")
+        result = function(*args)
+        # VmRSS is read after the reset, so can come out a page above VmHWM
+        return result, max(status_mb("VmHWM") - before, 0.0)
+    before = peak_rss_mb()
+    result = function(*args)
+    return result, peak_rss_mb() - before
+
+
+class StageTimer:
+    def __init__(self):
+        self.stages = {}
+
+    def run(self, name, rows, function, *args):
+        start = time.perf_counter()
+        result, rss_increase = stage_memory(function, *args)
+        seconds = time.perf_counter() - start
+        row_count = rows if isinstance(rows, int) else rows(result)
+        self.stages[name] = {
+            "seconds": round(seconds, 4),
+            "rows": row_count,
+            "rows_per_second": round(row_count / seconds) if seconds else None,
+            "rss_increase_mb": round(rss_increase, 1),
+        }
+        print(
+            f"  {name:<20} {seconds:8.3f}s {row_count:>10} rows"
+            f" {self.stages[name]['rows_per_second'] or 0:>10} rows/s"
+            f" {self.stages[name]['rss_increase_mb']:>+8} MB"
+        )
+        return result
+
+
+def read_batches(file_paths):
+    batches = []
+    for file_path in file_paths:
+        batches.extend(brokers.read_batches(trading212.adapter, file_path))
+    return batches
+
+
+def construct_transactions(batches):
+    return TransactionTable.from_transactions(
+        brokers.transactions_from_batches(trading212.adapter, batches)
+    )
+
+
+def derive_cash(share_transactions):
+    return TransactionTable.from_transactions(
+        trading212.derive_cash_transactions(share_transactions)
+    )
+
+
+def convert_nutmeg(file_paths):
+    return TransactionTable.concat(*map(brokers.convert_file, file_paths))
+
+
+def benchmark(size, work_folder, options):
+    input_folder = os.path.join(work_folder, "input")
+    output_folder = os.path.join(work_folder, "output")
+    os.makedirs(output_folder, exist_ok=True)
+    paths = generate(
+        input_folder,
+        size,
+        options.files,
+        options.dupe_ratio,
+        nutmeg_ratio=options.nutmeg_ratio,
+        seed=options.seed,
+    )
+    trading212_paths = [path for path in paths if "TRADING212" in path]
+    nutmeg_paths = [path for path in paths if "NUTMEG" in path]
+
+    print(f"{size} rows")
+    timer = StageTimer()
+    batches = timer.run(
+        "read",
+        lambda result: sum(map(len, result)),
+        read_batches,
+        trading212_paths,
+    )
+    share_transactions = timer.run("construct", len, construct_transactions, batches)
+    del batches
+    cash_transactions = timer.run("derive_cash", len, derive_cash, share_transactions)
+    all_transactions = timer.run(
+        "sort",
+        len,
+        lambda: TransactionTable.concat(
+            cash_transactions, share_transactions
+        ).sort_by_date(),
+    )
+    all_transactions, _ = timer.run(
+        "dedupe", len(all_transactions), dedupe_table, all_transactions
+    )
+    targets = {
+        "trading212.csv": trading212_target,
+        "yahoo.csv": yahoo_target,
+    }
+    timer.run(
+        "write",
+        len(all_transactions),
+        write_targets,
+        all_transactions,
+        [target(os.path.join(output_folder, name)) for name, target in targets.items()],
+    )
+    # Each file on its own as well, so a slowdown can be traced to one format
+    for name, target in targets.items():
+        timer.run(
+            f"write {name}",
+            len(all_transactions),
+            write_targets,
+            all_transactions,
+            [target(os.path.join(output_folder, name))],
+        )
+    if nutmeg_paths:
+        timer.run("nutmeg", len, convert_nutmeg, nutmeg_paths)
+
+    # The process's peak over every stage so far, sizes included
+    return {
+        "size": size,
+        "stages": timer.stages,
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+    }
+
+
+def compare(results, baseline, threshold):
+    # Flags every stage whose throughput dropped by more than threshold
+    previous = {
+        (result["size"], stage): values
+        for result in baseline["results"]
+        for stage, values in result["stages"].items()
+    }
+    regressions = []
+    for result in results["results"]:
+        for stage, values in result["stages"].items():
+            before = previous.get((result["size"], stage))
+            if not before or not before["rows_per_second"]:
+                continue
+            if not values["rows_per_second"]:
+                continue
+            change = values["rows_per_second"] / before["rows_per_second"] - 1
+            if change < -threshold:
+                regressions.append(
+                    f"{result['size']} rows, {stage}: {before['rows_per_second']}"
+                    f" -> {values['rows_per_second']} rows/s ({change:+.0%})"
+                )
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the conversion pipeline")
+    parser.add_argument(
+        "--sizes", nargs="+", default=default_sizes, help="e.g. 10k 100k 1M 10M"
+    )
+    parser.add_argument("--files", type=int, default=12)
+    parser.add_argument("--dupe-ratio", type=float, default=0.05)
+    parser.add_argument("--nutmeg-ratio", type=float, default=0.2)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument(
+        "--compare", help="earlier results file to check for regressions"
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.1,
+        help="allowed drop in rows/s before a stage counts as a regression",
+    )
+    parser.add_argument(
+        "--work-folder",
+        help="where to generate the exports (default: a temp folder)",
+    )
+    args = parser.parse_args()
+
+    results = {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "options": {
+            "files": args.files,
+            "dupe_ratio": args.dupe_ratio,
+            "nutmeg_ratio": args.nutmeg_ratio,
+            "seed": args.seed,
+        },
+        "results": [],
+    }
+    for size in args.sizes:
+        work_folder = args.work_folder or tempfile.mkdtemp(
+            prefix="portfolio-benchmark-"
+        )
+        try:
+            results["results"].append(benchmark(parse_size(size), work_folder, args))
+        finally:
+            if not args.work_folder:
+                shutil.rmtree(work_folder)
+
+    with open(args.output, "w") as file:
+        json.dump(results, file, indent=2)
+    print(f"Results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as file:
+            regressions = compare(results, json.load(file), args.threshold)
+        for regression in regressions:
+            print(f"Regression: {regression}")
+        if regressions:
+            sys.exit(1)
@@ -0,0 +1,81 @@
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+repo_folder = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+cli_file = os.path.join(repo_folder, "cli.py")
+
+# Commands that must start without loading the conversion pipeline
+default_commands = [["--help"], ["convert", "--list"]]
+# Top level packages none of them may import
+heavy_modules = ["numpy", "pyarrow", "sqlite3", "dateutil"]
+
+
+def parse_importtime(stderr):
+    # {module: cumulative microseconds} from python -X importtime output
+    imports = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:") :].split("|")
+        if cumulative.strip().isdigit():
+            imports[name.strip()] = int(cumulative)
+    return imports
+
+
+def measure(command, runs):
+    # Best wall time over the runs and the imports of the last one
+    best = None
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", cli_file, *command],
+            capture_output=True,
+            text=True,
+        )
+        seconds = time.perf_counter() - start
+        if result.returncode != 0:
+            sys.exit(f"{' '.join(command)} failed:\n{result.stderr}")
+        best = seconds if best is None else min(best, seconds)
+    return best, parse_importtime(result.stderr)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Check that trivial cli.py commands start quickly"
+    )
+    parser.add_argument(
+        "--input",
+        default=os.path.join(repo_folder, "input"),
+        help="folder of exports for convert --list (default: the repo's input/)",
+    )
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument(
+        "--budget-ms",
+        type=float,
+        default=100.0,
+        help="slowest allowed wall time per command (default: 100)",
+    )
+    args = parser.parse_args()
+
+    failures = []
+    for command in default_commands:
+        label = " ".join(command)
+        seconds, imports = measure(["--input", args.input, *command], args.runs)
+        heavy = sorted({name.split(".")[0] for name in imports} & set(heavy_modules))
+        own_imports = sum(imports.get(name, 0) for name in ["argparse", "brokers"])
+        print(
+            f"{label:<20} {seconds * 1000:7.1f} ms"
+            f" ({len(imports)} modules, argparse + brokers {own_imports / 1000:.1f} ms)"
+        )
+        if heavy:
+            failures.append(f"{label} imports {', '.join(heavy)}")
+        if seconds * 1000 > args.budget_ms:
+            failures.append(
+                f"{label} took {seconds * 1000:.0f} ms"
+                f" (budget {args.budget_ms:.0f} ms)"
+            )
+    if failures:
+        sys.exit("\n".join(failures))
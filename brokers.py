@@ -0,0 +1,134 @@
+import importlib
+import os
+from itertools import repeat
+
+# Modules declaring adapters; importing one registers its adapters. They
+# and this module only import the parsing code when a file is read, so
+# listing the exports in a folder doesn't load NumPy.
+adapter_modules = ["trading212_export", "nutmeg"]
+
+adapters = {}
+
+
+class BrokerAdapter:
+    # One kind of broker export: the files it comes in, the column holding
+    # each Transaction field and how its dates are written. date_formats are
+    # tried like DateParser formats (None: detect from dates.known_formats),
+    # constants are fields every row gets, fee_columns are summed into the
+    # fee, and prepare can fix up a row's fields before its Transaction is
+    # built.
+    def __init__(
+        self,
+        name,
+        broker,
+        prefix,
+        date_column,
+        columns,
+        date_formats=None,
+        constants=None,
+        fee_columns=(),
+        prepare=None,
+    ):
+        self.name = name
+        self.broker = broker
+        self.prefix = prefix
+        self.date_column = date_column
+        self.columns = columns
+        self.date_formats = date_formats
+        self.constants = constants or {}
+        self.fee_columns = list(fee_columns)
+        self.prepare = prepare
+
+    def matches(self, filename):
+        return filename.startswith(self.prefix) and filename.endswith(".csv")
+
+    def list_files(self, folder):
+        return [filename for filename in os.listdir(folder) if self.matches(filename)]
+
+    def date_parser(self):
+        from dates import DateParser
+
+        return DateParser(self.date_formats)
+
+
+def register(adapter):
+    adapters[adapter.name] = adapter
+    return adapter
+
+
+def load_adapters():
+    for module in adapter_modules:
+        importlib.import_module(module)
+    return adapters
+
+
+def adapter_for(file_path):
+    filename = os.path.basename(file_path)
+    for adapter in load_adapters().values():
+        if adapter.matches(filename):
+            return adapter
+    raise ValueError(f"No broker adapter reads {filename}")
+
+
+def read_columns(adapter):
+    # Export columns the adapter reads; the rest are never parsed
+    return list(
+        dict.fromkeys(
+            [adapter.date_column, *adapter.columns.values(), *adapter.fee_columns]
+        )
+    )
+
+
+def read_batches(adapter, file_path):
+    from readers import read_batches
+
+    return read_batches(file_path, read_columns(adapter))
+
+
+def transactions_from_batches(adapter, batches, parse_date=None):
+    from transaction import Transaction
+
+    if parse_date is None:
+        parse_date = adapter.date_parser()
+    fields = list(adapter.columns)
+    constants = adapter.constants
+    prepare = adapter.prepare
+
+    for batch in batches:
+        dates = batch.column(adapter.date_column)
+        rows = zip(*[batch.column(column) for column in adapter.columns.values()])
+        if adapter.fee_columns:
+            fees = zip(*[batch.column(column) for column in adapter.fee_columns])
+        else:
+            fees = repeat(())
+        for date, row, row_fees in zip(dates, rows, fees):
+            row_fields = dict(constants)
+            row_fields.update(zip(fields, row))
+            if prepare is not None:
+                prepare(row_fields)
+            transaction = Transaction(date=parse_date(date), **row_fields)
+            if row_fees:
+                transaction.compute_total_fee(*row_fees)
+            yield transaction
+
+
+def read_file(adapter, file_path, parse_date=None):
+    # Lazily yields the transactions of one export
+    from readers import iter_batches
+
+    yield from transactions_from_batches(
+        adapter, iter_batches(file_path, read_columns(adapter)), parse_date
+    )
+
+
+def convert_file(file_path):
+    # Reads any registered export into a table; module level so map_files can
+    # run it in worker processes
+    from instrumentation import stage
+    from transaction_table import TransactionTable
+
+    adapter = adapter_for(file_path)
+    with stage("read_transform") as current:
+        table = TransactionTable.from_transactions(read_file(adapter, file_path))
+        current.rows = len(table)
+    return table
@@ -0,0 +1,459 @@
+import argparse
+import os
+import sys
+
+# Only argparse, os and sys are imported up front: every command imports the
+# modules it needs when it runs, so `--help` or `convert --list` start without
+# loading NumPy, pyarrow, SQLite or dateutil. benchmarks/startup.py checks
+# this with `python -X importtime`.
+
+default_folder = "/Users/jakub/Development/portfolio-tracker"
+default_input = os.path.join(default_folder, "input")
+default_output = os.path.join(default_folder, "output")
+
+broker_names = ["trading212", "nutmeg"]
+export_formats = ["trading212", "yahoo", "parquet", "arrow"]
+# pnl.methods, repeated so building the parser doesn't import NumPy
+gain_methods = ["fifo", "average", "section104"]
+# watch.poll_interval, for the same reason
+poll_interval = 0.2
+
+
+def configure_folders(args):
+    # Points the converters' module level paths at --input and --output
+    import main
+    import trading212
+
+    trading212.input_folder = main.input_folder = args.input
+    trading212.output_csv_file = os.path.join(args.output, "trading212.csv")
+    trading212.yahoo_csv_file = os.path.join(args.output, "yahoo.csv")
+    trading212.dedupe_report_file = os.path.join(args.output, "dedupe_report.json")
+    trading212.manifest_file = os.path.join(args.output, "manifest.json")
+    main.yahoo_nutmeg_csv_file = os.path.join(args.output, "yahoo_nutmeg.csv")
+
+
+def list_files(args):
+    import brokers
+
+    if not os.path.isdir(args.input):
+        sys.exit(f"No input folder at {args.input}")
+    for name, adapter in brokers.load_adapters().items():
+        for csv_file in sorted(adapter.list_files(args.input)):
+            print(f"{name:<22} {csv_file}")
+
+
+def convert(args):
+    if args.list:
+        list_files(args)
+        return
+    if args.columnar and args.stream:
+        sys.exit("--columnar can't be combined with --stream")
+    if args.seen_index and args.stream:
+        sys.exit("--seen-index can't be combined with --stream")
+    if args.ledger and (args.stream or args.incremental):
+        sys.exit("--ledger only works with full conversions")
+
+    from collections import Counter
+
+    import main
+    import trading212
+    from columnar import pa
+    from instrumentation import configure_from_args, instrumentation, stage
+    from transaction import report_unknown_types
+
+    if args.columnar and pa is None:
+        sys.exit("--columnar needs pyarrow (pip install pyarrow)")
+    configure_folders(args)
+    configure_from_args(args)
+
+    if args.broker in (None, "trading212"):
+        print("---------------- TRADING212 ------------------")
+        trading212.columnar_file = args.columnar
+        trading212.ledger_file = args.ledger
+        trading212.seen_index_file = args.seen_index
+        input_files = trading212.adapter.list_files(args.input)
+        if args.stream:
+            trading212.convert_streaming(input_files)
+        elif args.incremental:
+            trading212.convert_changed(input_files, args.jobs)
+        else:
+            trading212.convert(input_files, args.jobs)
+
+    if args.broker in (None, "nutmeg"):
+        print("---------------- NUTMEG ------------------")
+        all_transactions = main.read_nutmeg(args.jobs, args.ledger)
+        print(f"{len(all_transactions)} total Nutmeg transactions")
+        report_unknown_types(
+            Counter(transaction.type for transaction in all_transactions)
+        )
+        with stage("write_yahoo") as current:
+            current.rows = len(all_transactions)
+            main.write_yahoo_nutmeg(all_transactions)
+    instrumentation.finish()
+
+
+def dedupe(args):
+    import trading212
+    from dedupe import SeenIndex
+    from parallel import map_files
+
+    configure_folders(args)
+    file_paths = [
+        os.path.join(args.input, csv_file)
+        for csv_file in trading212.adapter.list_files(args.input)
+    ]
+    tables = map_files(trading212.convert_file, file_paths, args.jobs)
+    seen_index = SeenIndex(args.seen_index) if args.seen_index else None
+    _, report = trading212.combine(
+        [cash for cash, _ in tables], [share for _, share in tables], seen_index
+    )
+    if seen_index is not None:
+        seen_index.close()
+    report.write(trading212.dedupe_report_file)
+
+    print(f"{report.total} transactions, {report.unique} unique")
+    print(f"{len(report.dupes)} dupes (details in {trading212.dedupe_report_file})")
+    if report.new_indices is not None:
+        print(f"{len(report.new_indices)} transactions not seen in previous runs")
+
+
+def load_table(args):
+    # The Trading212 transactions from --columnar, --ledger or the exports
+    from server import load_transactions
+
+    return load_transactions(args.input, args.columnar, args.ledger, args.jobs)
+
+
+def broker_tables(args):
+    # Date sorted tables by broker: Trading212 from --columnar, --ledger or
+    # the exports, Nutmeg from its exports (see main.nutmeg_table). Brokers
+    # without transactions are left out.
+    import main
+
+    configure_folders(args)
+    tables = {"trading212": load_table(args), "nutmeg": main.nutmeg_table(args.jobs)}
+    names = [args.broker] if args.broker else list(tables)
+    tables = {name: tables[name] for name in names if len(tables[name])}
+    if not tables:
+        sys.exit(f"No transactions in {args.input}")
+    return tables
+
+
+def load_rates(args):
+    from fx import FxRates
+
+    return FxRates.load(args.rates) if args.rates else FxRates.load()
+
+
+def gains(args):
+    from pnl import gains_by_tax_year, realized_gains, tax_year_bounds
+    from transaction_table import TransactionTable
+
+    # Disposals are matched across brokers, as HMRC pools every account
+    table = TransactionTable.concat(*broker_tables(args).values()).sort_by_date()
+    disposals, remaining = realized_gains(table, args.method, load_rates(args))
+    if args.tax_year is not None:
+        start, end = tax_year_bounds(args.tax_year)
+        disposals = [
+            disposal for disposal in disposals if start <= disposal.date < end
+        ]
+
+    for disposal in disposals:
+        print(
+            f"{disposal.date:%Y-%m-%d} {disposal.ticker:<12}"
+            f" {disposal.quantity:>16.6f} {disposal.proceeds:>12.2f}"
+            f" {disposal.cost:>12.2f} {disposal.gain:>12.2f} {disposal.rule}"
+        )
+    totals = gains_by_tax_year(disposals)
+    if args.tax_year is not None:
+        totals.setdefault(args.tax_year, 0.0)
+    for year, gain in sorted(totals.items()):
+        print(f"Tax year {year}/{(year + 1) % 100:02d} {gain:>14.2f}")
+    if args.tax_year is None:
+        for ticker, (quantity, cost) in sorted(remaining.items()):
+            print(f"Held {ticker:<12} {quantity:>16.6f} {cost:>12.2f}")
+
+
+def value(args):
+    import csv
+
+    from prices import PriceStore
+    from valuation import value_portfolio
+
+    # Without stored closes holdings are valued at their last traded price
+    store = PriceStore.open(args.prices or os.path.join(args.output, "prices"))
+    valuations = value_portfolio(
+        broker_tables(args), store, args.start, args.end, load_rates(args)
+    )
+    for name, valuation in valuations.items():
+        print(
+            f"{name:<12} {valuation.nav[-1]:>14.2f}"
+            f" TWR {valuation.twr():>8.2%} ({valuation.twr(annualised=True):.2%} a"
+            f" year) MWR {valuation.mwr():>8.2%}"
+        )
+    if args.series:
+        with open(args.series, "w", newline="") as csvfile:
+            writer = csv.writer(csvfile)
+            writer.writerow(["Date", *valuations])
+            navs = [valuation.nav for valuation in valuations.values()]
+            dates = valuations["total"].dates
+            for row, date in enumerate(dates):
+                writer.writerow([date, *(f"{nav[row]:.2f}" for nav in navs)])
+        print(f"Wrote {len(dates)} days to {args.series}")
+
+
+def watch(args):
+    from instrumentation import configure_from_args
+    from watch import watch as watch_folder
+
+    configure_folders(args)
+    configure_from_args(args)
+    try:
+        watch_folder(args.interval)
+    except KeyboardInterrupt:
+        pass
+
+
+def serve(args):
+    import asyncio
+
+    from server import Server, TransactionIndex
+
+    server = Server(TransactionIndex(load_table(args)), args.workers)
+    try:
+        asyncio.run(server.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+def holdings(args):
+    from datetime import datetime
+
+    from positions import Positions
+
+    positions = Positions.from_table(load_table(args))
+    as_of = args.as_of or datetime.now().isoformat(timespec="seconds")
+    for ticker, (shares, cost) in sorted(positions.holdings(as_of).items()):
+        print(f"{ticker:<12} {shares:>16.6f} {cost:>14.2f}")
+    print(f"{'cash':<12} {positions.cash_balance(as_of):>31.2f}")
+
+
+def export(args):
+    table = load_table(args)
+    if args.format in ("parquet", "arrow"):
+        from columnar import pa, write_columnar
+
+        if pa is None:
+            sys.exit(f"Exporting to {args.format} needs pyarrow (pip install pyarrow)")
+        if os.path.splitext(args.path)[1] != "." + args.format:
+            sys.exit(f"{args.format} exports must end in .{args.format}")
+        write_columnar(table, args.path)
+    else:
+        from writers import output_formats, write_targets
+
+        write_targets(table, [output_formats[args.format](args.path)])
+    print(f"Wrote {len(table)} transactions to {args.path}")
+
+
+def add_source_arguments(parser):
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument(
+        "--columnar", metavar="PATH", help="read a .parquet or .arrow file"
+    )
+    source.add_argument("--ledger", metavar="PATH", help="read an SQLite ledger")
+
+
+def add_analysis_arguments(parser):
+    parser.add_argument(
+        "--broker", choices=broker_names, help="only this broker's transactions"
+    )
+    parser.add_argument(
+        "--rates",
+        metavar="FOLDER",
+        help="folder of daily exchange rates, e.g. GBPUSD=X.csv (default: fx.py's)",
+    )
+    add_source_arguments(parser)
+    add_jobs_argument(parser)
+
+
+def add_input_argument(parser):
+    # Also used by the watch.py and server.py scripts
+    parser.add_argument(
+        "--input",
+        default=os.environ.get("PORTFOLIO_TRACKER_INPUT", default_input),
+        help="folder of broker exports (default: $PORTFOLIO_TRACKER_INPUT or"
+        f" {default_input})",
+    )
+
+
+def add_output_argument(parser):
+    parser.add_argument(
+        "--output",
+        default=os.environ.get("PORTFOLIO_TRACKER_OUTPUT", default_output),
+        help="folder the outputs are written to (default: $PORTFOLIO_TRACKER_OUTPUT"
+        f" or {default_output})",
+    )
+
+
+def add_jobs_argument(parser):
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=1,
+        help="number of processes used to parse exports (default: 1)",
+    )
+
+
+def build_parser():
+    from instrumentation import add_arguments
+
+    parser = argparse.ArgumentParser(
+        prog="portfolio-tracker",
+        description="Convert broker exports and query the transactions",
+    )
+    add_input_argument(parser)
+    add_output_argument(parser)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    convert_parser = commands.add_parser(
+        "convert", help="convert the exports to the tracker's CSV files"
+    )
+    convert_parser.add_argument(
+        "--broker", choices=broker_names, help="only convert this broker's exports"
+    )
+    convert_parser.add_argument(
+        "--list", action="store_true", help="list the exports found and exit"
+    )
+    convert_parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="merge date-ordered Trading212 exports on the fly with constant"
+        " memory use",
+    )
+    convert_parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="only convert Trading212 exports added or changed since the last run",
+    )
+    add_jobs_argument(convert_parser)
+    convert_parser.add_argument(
+        "--ledger",
+        metavar="PATH",
+        help="also add the transactions to this SQLite ledger (not with --stream"
+        " or --incremental)",
+    )
+    convert_parser.add_argument(
+        "--columnar",
+        metavar="PATH",
+        help="also write the Trading212 transactions to a .parquet or .arrow file"
+        " (needs pyarrow)",
+    )
+    convert_parser.add_argument(
+        "--seen-index",
+        metavar="PATH",
+        help="SQLite file of Trading212 IDs from earlier runs; reports and records"
+        " the new rows (not with --stream)",
+    )
+    add_arguments(convert_parser)
+    convert_parser.set_defaults(run=convert)
+
+    dedupe_parser = commands.add_parser(
+        "dedupe", help="report the duplicate Trading212 transactions"
+    )
+    dedupe_parser.add_argument(
+        "--seen-index",
+        metavar="PATH",
+        help="SQLite file of IDs from earlier runs; also reports the new rows",
+    )
+    add_jobs_argument(dedupe_parser)
+    dedupe_parser.set_defaults(run=dedupe)
+
+    holdings_parser = commands.add_parser(
+        "holdings", help="show the shares held and the cash balance"
+    )
+    holdings_parser.add_argument("--as-of", help="YYYY-MM-DD (default: now)")
+    add_source_arguments(holdings_parser)
+    add_jobs_argument(holdings_parser)
+    holdings_parser.set_defaults(run=holdings)
+
+    export_parser = commands.add_parser(
+        "export", help="write the Trading212 transactions in another format"
+    )
+    export_parser.add_argument("format", choices=export_formats)
+    export_parser.add_argument("path")
+    add_source_arguments(export_parser)
+    add_jobs_argument(export_parser)
+    export_parser.set_defaults(run=export)
+
+    gains_parser = commands.add_parser(
+        "gains", help="show the realised capital gains by disposal and tax year"
+    )
+    gains_parser.add_argument(
+        "--method",
+        choices=gain_methods,
+        default="section104",
+        help="how disposals are matched with purchases (default: section104)",
+    )
+    gains_parser.add_argument(
+        "--tax-year",
+        type=int,
+        metavar="YEAR",
+        help="only the UK tax year starting 6 April YEAR",
+    )
+    add_analysis_arguments(gains_parser)
+    gains_parser.set_defaults(run=gains)
+
+    value_parser = commands.add_parser(
+        "value", help="show the portfolio value and its time and money weighted returns"
+    )
+    value_parser.add_argument(
+        "--start", help="YYYY-MM-DD (default: the first transaction)"
+    )
+    value_parser.add_argument(
+        "--end", help="YYYY-MM-DD (default: the last transaction)"
+    )
+    value_parser.add_argument(
+        "--prices",
+        metavar="FOLDER",
+        help="price store built by prices.py (default: OUTPUT/prices)",
+    )
+    value_parser.add_argument(
+        "--series", metavar="PATH", help="also write the daily values to this CSV"
+    )
+    add_analysis_arguments(value_parser)
+    value_parser.set_defaults(run=value)
+
+    watch_parser = commands.add_parser(
+        "watch", help="convert exports as they are added to the input folder"
+    )
+    watch_parser.add_argument(
+        "--interval",
+        type=float,
+        default=poll_interval,
+        help=f"seconds between scans of the input folder (default: {poll_interval})",
+    )
+    add_arguments(watch_parser)
+    watch_parser.set_defaults(run=watch)
+
+    serve_parser = commands.add_parser(
+        "serve", help="serve transactions, holdings and cash over HTTP"
+    )
+    serve_parser.add_argument("--host", default="127.0.0.1")
+    serve_parser.add_argument("--port", type=int, default=8212)
+    serve_parser.add_argument(
+        "--workers", type=int, help="threads for lookups and serialisation"
+    )
+    add_source_arguments(serve_parser)
+    add_jobs_argument(serve_parser)
+    serve_parser.set_defaults(run=serve)
+    return parser
+
+
+def run(argv=None):
+    # The portfolio-tracker command installed by pyproject.toml
+    args = build_parser().parse_args(argv)
+    args.run(args)
+
+
+if __name__ == "__main__":
+    run()
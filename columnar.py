@@ -0,0 +1,133 @@
+import os
+
+import numpy as np
+
+from transaction_table import TransactionTable, categorical_columns, numeric_columns
+
+# pyarrow is optional: only writing or reading these files needs it
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+format_name = "portfolio-tracker transactions"
+format_version = "1"
+
+
+def require_pyarrow():
+    if pa is None:
+        raise ImportError("Parquet and Arrow files need pyarrow (pip install pyarrow)")
+
+
+def to_arrow(table):
+    # Dates become timestamp[us], the string columns stay dictionary encoded
+    # with their existing codes, empty numbers and default comments are nulls
+    # and IDs are 16 byte fixed size binaries
+    require_pyarrow()
+    columns = {"date": pa.array(table.dates_epoch.view("datetime64[us]"))}
+    for name in categorical_columns:
+        categories = table.categories[name]
+        codes = table.codes[name]
+        # Missing values are null entries rather than a None in the dictionary
+        mask = None
+        if None in categories:
+            mask = codes == categories.index(None)
+            categories = ["" if value is None else value for value in categories]
+        columns[name] = pa.DictionaryArray.from_arrays(
+            pa.array(codes, type=pa.int32()),
+            pa.array(categories, type=pa.string()),
+            mask=mask,
+        )
+    for name in numeric_columns:
+        values = table.numbers[name]
+        columns[name] = pa.array(values, mask=np.isnan(values))
+    columns["comment"] = pa.array(table.comments.tolist(), type=pa.string())
+    columns["id"] = pa.FixedSizeBinaryArray.from_buffers(
+        pa.binary(16), len(table), [None, pa.py_buffer(table.ids.view(np.uint8))]
+    )
+    return pa.table(columns).replace_schema_metadata(
+        {"format": format_name, "version": format_version}
+    )
+
+
+def single_array(column):
+    if column.num_chunks == 1:
+        return column.chunk(0)
+    if not column.num_chunks:
+        return pa.array([], type=column.type)
+    return pa.concat_arrays(column.chunks)
+
+
+def from_arrow(arrow_table):
+    require_pyarrow()
+    metadata = arrow_table.schema.metadata or {}
+    if metadata.get(b"format") != format_name.encode():
+        raise ValueError("Not a portfolio-tracker transactions file")
+    arrow_table = arrow_table.unify_dictionaries()
+
+    def column(name):
+        return single_array(arrow_table.column(name))
+
+    codes = {}
+    categories = {}
+    for name in categorical_columns:
+        array = column(name)
+        values = array.dictionary.to_pylist()
+        indices = array.indices
+        if array.null_count:
+            values.append(None)
+            indices = indices.fill_null(len(values) - 1)
+        codes[name] = indices.to_numpy(zero_copy_only=False).astype(
+            np.int32, copy=False
+        )
+        categories[name] = values
+
+    ids = column("id")
+    return TransactionTable(
+        column("date").to_numpy(zero_copy_only=False).view(np.int64),
+        codes,
+        categories,
+        {
+            name: column(name).to_numpy(zero_copy_only=False)
+            for name in numeric_columns
+        },
+        column("comment").to_numpy(zero_copy_only=False).astype(object, copy=False),
+        np.frombuffer(
+            ids.buffers()[1], dtype="V16", count=len(ids), offset=ids.offset * 16
+        ),
+    )
+
+
+def is_parquet(path):
+    return path.endswith(".parquet")
+
+
+def write_columnar(table, path):
+    # .parquet files are compressed, anything else (.arrow, .feather) is an
+    # uncompressed Arrow IPC file that loads by memory mapping. Written to a
+    # temporary file and renamed, like the CSV outputs.
+    arrow_table = to_arrow(table)
+    temporary = path + ".tmp"
+    try:
+        if is_parquet(path):
+            pq.write_table(arrow_table, temporary)
+        else:
+            with pa.OSFile(temporary, "wb") as sink:
+                with pa.ipc.new_file(sink, arrow_table.schema) as writer:
+                    writer.write_table(arrow_table)
+    except BaseException:
+        if os.path.exists(temporary):
+            os.remove(temporary)
+        raise
+    os.replace(temporary, path)
+
+
+def read_columnar(path):
+    # Returns the TransactionTable written by write_columnar
+    require_pyarrow()
+    if is_parquet(path):
+        return from_arrow(pq.read_table(path, read_dictionary=categorical_columns))
+    # The returned arrays keep the memory map alive
+    return from_arrow(pa.ipc.open_file(pa.memory_map(path)).read_all())
@@ -0,0 +1,79 @@
+from datetime import datetime, timedelta
+
+EPOCH = datetime(1970, 1, 1)
+MICROSECOND = timedelta(microseconds=1)
+MICROSECONDS_PER_DAY = 86_400 * 1_000_000
+
+# Date formats seen in broker exports (Trading212 "Time", Nutmeg "Date"),
+# None meaning datetime.fromisoformat. Slash dates like 03/02/2023 aren't
+# here: whether they are day or month first can't be told from one value,
+# so they always go through dateutil.
+known_formats = [
+    None,
+    "%Y-%m-%d %H:%M:%S",
+    "%d-%b-%y",
+    "%d-%b-%Y",
+]
+
+
+def to_epoch(date):
+    # Dates are kept in broker local time, so any timezone is simply dropped
+    if isinstance(date, str):
+        date = datetime.fromisoformat(date)
+    if date.tzinfo is not None:
+        date = date.replace(tzinfo=None)
+    return (date - EPOCH) // MICROSECOND
+
+
+def from_epoch(value):
+    return EPOCH + timedelta(microseconds=int(value))
+
+
+def parse_any(value):
+    # dateutil is only imported once a date needs it
+    from dateutil import parser
+
+    return parser.parse(value)
+
+
+def compile_format(date_format):
+    if date_format is None:
+        return datetime.fromisoformat
+    return lambda value: datetime.strptime(value, date_format)
+
+
+class DateParser:
+    # Works out the format of a source from its first date, keeping only a
+    # format that gives the same result as dateutil, and then uses that format
+    # directly. Values that don't match it still go through dateutil.
+    def __init__(self, formats=None):
+        self.formats = known_formats if formats is None else formats
+        self.parse = None
+
+    def __call__(self, value):
+        if isinstance(value, datetime):
+            return value
+        if self.parse is None:
+            return self.detect(value)
+        try:
+            return self.parse(value)
+        except ValueError:
+            return parse_any(value)
+
+    def detect(self, value):
+        expected = parse_any(value)
+        for date_format in self.formats:
+            parse = compile_format(date_format)
+            try:
+                matches = parse(value) == expected
+            except ValueError:
+                continue
+            if matches:
+                self.parse = parse
+                return expected
+        # Nothing matched, so every value will go through dateutil
+        self.parse = parse_any
+        return expected
+
+
+parse_date = DateParser()
@@ -0,0 +1,101 @@
+import json
+import sqlite3
+
+
+class SeenIndex:
+    # On-disk set of raw 16 byte transaction IDs, kept between runs so that a
+    # run can tell which of its rows have never been converted before
+    def __init__(self, path):
+        self.connection = sqlite3.connect(path)
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS seen_ids (id BLOB PRIMARY KEY) WITHOUT ROWID"
+        )
+        self.ids = {
+            row[0] for row in self.connection.execute("SELECT id FROM seen_ids")
+        }
+
+    def __contains__(self, transaction_id):
+        return transaction_id in self.ids
+
+    def __len__(self):
+        return len(self.ids)
+
+    def add_many(self, transaction_ids):
+        new_ids = [
+            transaction_id
+            for transaction_id in transaction_ids
+            if transaction_id not in self.ids
+        ]
+        with self.connection:
+            self.connection.executemany(
+                "INSERT OR IGNORE INTO seen_ids (id) VALUES (?)",
+                ((transaction_id,) for transaction_id in new_ids),
+            )
+        self.ids.update(new_ids)
+
+    def close(self):
+        self.connection.close()
+
+
+class DedupeReport:
+    def __init__(self):
+        self.total = 0
+        self.unique = 0
+        self.new_indices = None  # Rows not in the SeenIndex, if one is used
+        self.dupes = []
+
+    def add_dupe(self, transaction, index, first_index):
+        self.dupes.append(
+            {
+                "id": transaction.id,
+                "index": index,
+                "first_index": first_index,
+                "transaction": transaction.to_dict(),
+            }
+        )
+
+    def to_dict(self):
+        return {
+            "total": self.total,
+            "unique": self.unique,
+            "new": None if self.new_indices is None else len(self.new_indices),
+            "dupe_count": len(self.dupes),
+            "dupes": self.dupes,
+        }
+
+    def write(self, path):
+        with open(path, "w") as file:
+            json.dump(self.to_dict(), file, indent=2, default=str)
+
+
+def dedupe_table(table, seen_index=None):
+    # Keeps the first occurrence of every ID and returns the unique rows together
+    # with a report of the dupes
+    first_seen = {}
+    unique_indices = []
+    dupe_indices = []
+    report = DedupeReport()
+
+    for index, transaction_id in enumerate(table.ids):
+        transaction_id = transaction_id.tobytes()
+        if transaction_id not in first_seen:
+            first_seen[transaction_id] = index
+            unique_indices.append(index)
+            continue
+        dupe_indices.append((index, first_seen[transaction_id]))
+
+    for index, first_index in dupe_indices:
+        report.add_dupe(table.transaction(index), index, first_index)
+
+    report.total = len(table)
+    report.unique = len(unique_indices)
+
+    if seen_index is not None:
+        report.new_indices = [
+            position
+            for position, transaction_id in enumerate(first_seen)
+            if transaction_id not in seen_index
+        ]
+        seen_index.add_many(first_seen)
+
+    return table.take(unique_indices), report
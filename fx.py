@@ -0,0 +1,181 @@
+import argparse
+import os
+import re
+
+import numpy as np
+
+from dates import MICROSECONDS_PER_DAY, from_epoch, to_epoch
+from prices import price_columns, read_price_file
+
+rate_folder = "/Users/jakub/Development/portfolio-tracker/rates"
+
+# Currency everything is valued in, the currency of the accounts
+account_currency = "GBP"
+
+
+def pair_from_filename(filename):
+    # GBPUSD=X.csv, Yahoo Finance's name for the GBP/USD history, holds the
+    # USD price of one GBP
+    match = re.fullmatch(r"([A-Z]{3})([A-Z]{3})(=X)?\.csv", filename)
+    if match is None:
+        return None
+    return match.group(1), match.group(2)
+
+
+class RateSeries:
+    # Rate of one currency pair for every calendar day from its first quote to
+    # its last. Weekends and holidays carry the previous quote, so looking up
+    # a day is an index into the array; days after the last quote get the
+    # last one and days before the first none (NaN).
+    def __init__(self, first_day, rates):
+        self.first_day = first_day
+        self.rates = rates
+
+    @classmethod
+    def from_quotes(cls, days, rates):
+        order = np.argsort(days, kind="stable")
+        days = days[order]
+        rates = rates[order]
+        every_day = np.arange(days[0], days[-1] + 1)
+        index = np.searchsorted(days, every_day, side="right") - 1
+        return cls(int(days[0]), rates[index])
+
+    @property
+    def last_day(self):
+        return self.first_day + len(self.rates) - 1
+
+    def at(self, days):
+        offset = np.asarray(days) - self.first_day
+        rates = self.rates[np.clip(offset, 0, len(self.rates) - 1)]
+        return np.where(offset >= 0, rates, np.nan)
+
+    def inverse(self):
+        return RateSeries(self.first_day, 1.0 / self.rates)
+
+    def cross(self, other):
+        # self gives B per A and other C per B: the result gives C per A over
+        # the days both cover
+        first = max(self.first_day, other.first_day)
+        last = min(self.last_day, other.last_day)
+        if last < first:
+            return None
+        days = np.arange(first, last + 1)
+        return RateSeries(first, self.at(days) * other.at(days))
+
+
+class FxRates:
+    # Daily rates by (base, quote) pair, quoted as units of quote per base
+    # like the Trading212 "Exchange rate" column. A pair missing from the
+    # files is derived from its inverse or crossed through the account
+    # currency, once, when first asked for.
+    def __init__(self, series=None):
+        self.series = series if series is not None else {}
+        self.derived = {}
+
+    @classmethod
+    def load(cls, folder=rate_folder):
+        rates = cls()
+        if not os.path.isdir(folder):
+            return rates
+        for filename in sorted(os.listdir(folder)):
+            pair = pair_from_filename(filename)
+            if pair is None:
+                continue
+            dates, values = read_price_file(os.path.join(folder, filename))
+            if len(dates):
+                closes = values[price_columns.index("Close")]
+                rates.add(*pair, dates // MICROSECONDS_PER_DAY, closes)
+        return rates
+
+    def add(self, base, quote, days, rates):
+        self.series[base, quote] = RateSeries.from_quotes(
+            np.asarray(days, dtype=np.int64), np.asarray(rates, dtype=np.float64)
+        )
+        self.derived.clear()
+
+    @property
+    def pairs(self):
+        return sorted(self.series)
+
+    def pair(self, base, quote):
+        # The RateSeries of quote per base, or None if it can't be worked out
+        key = (base, quote)
+        if key in self.series:
+            return self.series[key]
+        if key not in self.derived:
+            self.derived[key] = self.derive(base, quote)
+        return self.derived[key]
+
+    def derive(self, base, quote):
+        if (quote, base) in self.series:
+            return self.series[quote, base].inverse()
+        if account_currency in (base, quote):
+            return None
+        first = self.pair(base, account_currency)
+        second = self.pair(account_currency, quote)
+        if first is None or second is None:
+            return None
+        return first.cross(second)
+
+    def rates_on(self, base, quote, days):
+        # quote per base on each day, or None for an unknown pair
+        if base == quote:
+            return np.ones(len(days))
+        series = self.pair(base, quote)
+        return None if series is None else series.at(days)
+
+    def convert(self, amounts, codes, currencies, epochs, to=account_currency):
+        # Converts a column of amounts, each in the currency currencies[code]
+        # of its row, at the rate of its row's day. One gather per currency;
+        # rows in an unknown currency come back NaN, rows without a currency
+        # are taken to be in the target one already.
+        amounts = np.asarray(amounts, dtype=np.float64)
+        days = np.asarray(epochs) // MICROSECONDS_PER_DAY
+        converted = np.full(len(amounts), np.nan)
+        for code, currency in enumerate(currencies):
+            rows = np.flatnonzero(codes == code)
+            if not len(rows):
+                continue
+            if not currency:
+                converted[rows] = amounts[rows]
+                continue
+            rates = self.rates_on(to, currency, days[rows])
+            if rates is not None:
+                converted[rows] = amounts[rows] / rates
+        return converted
+
+    def convert_table(self, table, amounts, column="source_currency"):
+        # amounts (one per row of table) are in the currency in column
+        return self.convert(
+            amounts, table.codes[column], table.categories[column], table.dates_epoch
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Look up daily exchange rates")
+    parser.add_argument(
+        "--input", default=rate_folder, help="folder of e.g. GBPUSD=X.csv files"
+    )
+    parser.add_argument("--base", default=account_currency)
+    parser.add_argument("--quote", help="show this currency's rates (default: list pairs)")
+    parser.add_argument("dates", nargs="*", help="YYYY-MM-DD")
+    args = parser.parse_args()
+
+    rates = FxRates.load(args.input)
+    if args.quote is None:
+        for base, quote in rates.pairs:
+            series = rates.series[base, quote]
+            print(
+                f"{base}/{quote} {from_epoch(series.first_day * MICROSECONDS_PER_DAY).date()}"
+                f" - {from_epoch(series.last_day * MICROSECONDS_PER_DAY).date()}"
+            )
+    else:
+        days = np.array(
+            [to_epoch(date) // MICROSECONDS_PER_DAY for date in args.dates],
+            dtype=np.int64,
+        )
+        values = rates.rates_on(args.base, args.quote, days)
+        if values is None:
+            parser.error(f"No rates for {args.base}/{args.quote}")
+        for date, value in zip(args.dates, values):
+            print(f"{date} {args.base}/{args.quote} {value:.6f}")
@@ -0,0 +1,118 @@
+import hashlib
+import struct
+from functools import lru_cache
+
+import numpy as np
+
+from dates import to_epoch
+
+# Transaction IDs are 16 byte BLAKE2b digests of a fixed binary layout of the
+# fields that identify a transaction: the date as epoch microseconds, each
+# string as an 8 byte hash of its text and each amount as a fixed-point
+# integer, all little endian. The same bytes are packed a row at a time for
+# a single Transaction and a column at a time for a whole table.
+id_fields = [
+    "date",
+    "action",
+    "type",
+    "ticker",
+    "original_ticker",
+    "share_amount",
+    "share_price",
+    "total",
+]
+string_fields = ["action", "type", "ticker", "original_ticker"]
+amount_fields = ["share_amount", "share_price", "total"]
+
+pack_record = struct.Struct("<qQQQQqqq").pack
+record_dtype = np.dtype(
+    [("date", "<i8")]
+    + [(name, "<u8") for name in string_fields]
+    + [(name, "<i8") for name in amount_fields]
+)
+record_size = record_dtype.itemsize
+
+# Amounts are kept to 10 decimal places, finer than any broker reports
+fixed_point_scale = 10**10
+# Stands in for an empty (NaN) amount
+missing_amount = -(2**63)
+
+digest_size = 16
+personalisation = b"portfolio-txn-2"
+
+
+@lru_cache(maxsize=None)
+def string_hash(value):
+    # None (an empty field) hashes to 0
+    if value is None:
+        return 0
+    digest = hashlib.blake2b(value.encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "little")
+
+
+def fixed_point_column(values):
+    missing = np.isnan(values)
+    scaled = np.rint(np.where(missing, 0.0, values) * fixed_point_scale)
+    return np.where(missing, missing_amount, scaled.astype(np.int64))
+
+
+# Copying a set up hasher is cheaper than creating one per record
+blank_hasher = hashlib.blake2b(digest_size=digest_size, person=personalisation)
+
+
+def hash_record(record):
+    hasher = blank_hasher.copy()
+    hasher.update(record)
+    return hasher.digest()
+
+
+def row_digest(timestamp, action, type, ticker, original_ticker, amounts):
+    # amounts are share_amount, share_price and total
+    hasher = blank_hasher.copy()
+    hasher.update(
+        pack_record(
+            to_epoch(timestamp),
+            string_hash(action),
+            string_hash(type),
+            string_hash(ticker),
+            string_hash(original_ticker),
+            *[
+                round(amount * fixed_point_scale)
+                if amount == amount
+                else missing_amount
+                for amount in amounts
+            ],
+        )
+    )
+    return hasher.digest()
+
+
+def pack_columns(dates_epoch, codes, categories, numbers):
+    # One packed record per row. Strings are hashed once per distinct value
+    # and gathered through the column's codes.
+    records = np.empty(len(dates_epoch), dtype=record_dtype)
+    records["date"] = dates_epoch
+    for name in string_fields:
+        hashes = np.array(
+            [string_hash(value) for value in categories[name]], dtype=np.uint64
+        )
+        records[name] = hashes[codes[name]] if len(hashes) else 0
+    for name in amount_fields:
+        records[name] = fixed_point_column(numbers[name])
+    return records
+
+
+def hash_records(records):
+    # Digests of packed records as a V16 array
+    data = memoryview(records.view(np.uint8).reshape(-1))
+    digests = b"".join(
+        [
+            hash_record(data[start : start + record_size])
+            for start in range(0, len(data), record_size)
+        ]
+    )
+    return np.frombuffer(digests, dtype=f"V{digest_size}")
+
+
+def table_ids(dates_epoch, codes, categories, numbers):
+    return hash_records(pack_columns(dates_epoch, codes, categories, numbers))
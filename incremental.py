@@ -0,0 +1,169 @@
+import hashlib
+import json
+import os
+from datetime import datetime
+
+from dates import from_epoch
+from instruments import instrument_file
+from parallel import map_files
+from transaction_table import TransactionTable
+
+manifest_version = 2
+
+
+def hash_file(file_path):
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as file:
+        for chunk in iter(lambda: file.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class Manifest:
+    # Remembers every input file converted so far (size, mtime, content hash,
+    # row counts and date range) and where its converted rows are cached
+    def __init__(self, path, files=None):
+        self.path = path
+        self.cache_folder = os.path.join(os.path.dirname(path), "cache")
+        self.files = files if files is not None else {}
+
+    @classmethod
+    def load(cls, path):
+        if not os.path.exists(path):
+            return cls(path)
+        with open(path) as file:
+            data = json.load(file)
+        # Cached tables hold tickers resolved through the instrument file, so
+        # editing it invalidates them like a new manifest version does
+        if data.get("version") != manifest_version:
+            return cls(path)
+        if data.get("instruments") != hash_file(instrument_file):
+            return cls(path)
+        return cls(path, data["files"])
+
+    def save(self):
+        os.makedirs(self.cache_folder, exist_ok=True)
+        with open(self.path, "w") as file:
+            json.dump(
+                {
+                    "version": manifest_version,
+                    "instruments": hash_file(instrument_file),
+                    "files": self.files,
+                },
+                file,
+                indent=2,
+            )
+
+        # Drop cached tables no longer referenced by any input file
+        in_use = {entry["cache"] for entry in self.files.values()}
+        for filename in os.listdir(self.cache_folder):
+            if filename not in in_use:
+                os.remove(os.path.join(self.cache_folder, filename))
+
+    def is_unchanged(self, name, file_path):
+        entry = self.files.get(name)
+        if entry is None:
+            return False
+        if not os.path.exists(os.path.join(self.cache_folder, entry["cache"])):
+            return False
+        stat = os.stat(file_path)
+        if entry["size"] == stat.st_size and entry["mtime"] == stat.st_mtime_ns:
+            return True
+        # Touched but not modified, e.g. copied again from a download folder
+        if entry["size"] == stat.st_size and entry["hash"] == hash_file(file_path):
+            entry["mtime"] = stat.st_mtime_ns
+            return True
+        return False
+
+    def update(self, name, file_path, table, cash_rows):
+        stat = os.stat(file_path)
+        content_hash = hash_file(file_path)
+        cache = f"{content_hash}.npz"
+        os.makedirs(self.cache_folder, exist_ok=True)
+        table.save(os.path.join(self.cache_folder, cache))
+
+        dates = table.dates_epoch
+        self.files[name] = {
+            "size": stat.st_size,
+            "mtime": stat.st_mtime_ns,
+            "hash": content_hash,
+            "rows": len(table) - cash_rows,
+            "cash_rows": cash_rows,
+            "min_date": from_epoch(dates.min()).isoformat() if len(dates) else None,
+            "max_date": from_epoch(dates.max()).isoformat() if len(dates) else None,
+            "cache": cache,
+        }
+
+    def load_table(self, name):
+        # Returns the cached cash and share rows of a file
+        entry = self.files[name]
+        table = TransactionTable.load(os.path.join(self.cache_folder, entry["cache"]))
+        cash_rows = entry["cash_rows"]
+        return table.take(slice(0, cash_rows)), table.take(slice(cash_rows, None))
+
+    def date_range(self, name):
+        entry = self.files[name]
+        if entry["min_date"] is None:
+            return None, None
+        return (
+            datetime.fromisoformat(entry["min_date"]),
+            datetime.fromisoformat(entry["max_date"]),
+        )
+
+
+def convert_incremental(
+    input_folder, input_files, output_files, manifest_path, convert_file, finish, jobs=1
+):
+    # convert_file(file_path) returns the (cash, share) tables of one export,
+    # finish(cash_tables, share_tables, append) sorts, dedupes and writes them.
+    # Unchanged files are served from the cache. When the only change is new
+    # files whose rows all come after the existing output, those rows are
+    # appended to the outputs instead of rewriting them.
+    manifest = Manifest.load(manifest_path)
+    previous = set(manifest.files)
+    removed = previous - set(input_files)
+    for name in removed:
+        del manifest.files[name]
+
+    changed = [
+        name
+        for name in input_files
+        if not manifest.is_unchanged(name, os.path.join(input_folder, name))
+    ]
+    file_paths = [os.path.join(input_folder, name) for name in changed]
+    converted = dict(zip(changed, map_files(convert_file, file_paths, jobs)))
+    for name, file_path in zip(changed, file_paths):
+        cash_transactions, share_transactions = converted[name]
+        manifest.update(
+            name,
+            file_path,
+            TransactionTable.concat(cash_transactions, share_transactions),
+            len(cash_transactions),
+        )
+
+    outputs_exist = all(os.path.exists(path) for path in output_files)
+    if not changed and not removed and outputs_exist:
+        manifest.save()
+        return None
+
+    new_files = [name for name in changed if name not in previous]
+    last_dates = [
+        manifest.date_range(name)[1] for name in input_files if name not in changed
+    ]
+    last_dates = [date for date in last_dates if date is not None]
+    first_new_dates = [manifest.date_range(name)[0] for name in new_files]
+    appendable = (
+        outputs_exist
+        and not removed
+        and len(new_files) == len(changed)
+        and len(last_dates) > 0
+        and all(date is None or date > max(last_dates) for date in first_new_dates)
+    )
+
+    names = new_files if appendable else input_files
+    tables = [converted.get(name) or manifest.load_table(name) for name in names]
+    report = finish(
+        [cash for cash, _ in tables], [share for _, share in tables], appendable
+    )
+    manifest.save()
+    return report
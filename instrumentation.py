@@ -0,0 +1,150 @@
+import time
+
+# cProfile, json and tracemalloc are imported when an option needs them, so
+# commands that only add the arguments stay quick to start
+
+
+class NullStage:
+    # Handed out while instrumentation is off, so a disabled stage costs one
+    # function call and nothing is recorded
+    rows = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+null_stage = NullStage()
+
+
+class Stage:
+    def __init__(self, instrumentation, name):
+        self.instrumentation = instrumentation
+        self.name = name
+        self.rows = None
+        self.profiler = None
+
+    def __enter__(self):
+        instrumentation = self.instrumentation
+        self.parent = instrumentation.stack[-1] if instrumentation.stack else None
+        instrumentation.stack.append(self.name)
+        if instrumentation.trace_memory:
+            import tracemalloc
+
+            self.memory_before = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+        if self.name == instrumentation.profile_stage:
+            import cProfile
+
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        seconds = time.perf_counter() - self.start
+        instrumentation = self.instrumentation
+        if self.profiler is not None:
+            self.profiler.disable()
+            self.profiler.dump_stats(instrumentation.profile_path)
+        instrumentation.stack.pop()
+
+        record = {"stage": self.name, "parent": self.parent, "seconds": seconds}
+        if self.rows is not None:
+            record["rows"] = self.rows
+            record["rows_per_second"] = self.rows / seconds if seconds else None
+        if instrumentation.trace_memory:
+            import tracemalloc
+
+            current, peak = tracemalloc.get_traced_memory()
+            # Peaks of nested stages are measured from the start of the inner stage
+            record["allocated_bytes"] = current - self.memory_before
+            record["peak_bytes"] = peak - self.memory_before
+        instrumentation.records.append(record)
+        return False
+
+
+class Instrumentation:
+    def __init__(self):
+        self.enabled = False
+        self.trace_path = None
+        self.trace_memory = False
+        self.profile_stage = None
+        self.profile_path = None
+        self.records = []
+        self.stack = []
+
+    def configure(
+        self, trace_path=None, trace_memory=False, profile_stage=None, profile_path=None
+    ):
+        self.trace_path = trace_path
+        self.trace_memory = trace_memory
+        self.profile_stage = profile_stage
+        self.profile_path = profile_path or f"{profile_stage}.prof"
+        self.enabled = bool(trace_path or trace_memory or profile_stage)
+        if trace_memory:
+            import tracemalloc
+
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+
+    def stage(self, name):
+        if not self.enabled:
+            return null_stage
+        return Stage(self, name)
+
+    def summary(self):
+        lines = []
+        for record in self.records:
+            line = f"{record['stage']:<20} {record['seconds']:9.3f}s"
+            if "rows" in record:
+                line += f" {record['rows']:>10} rows"
+                if record["rows_per_second"]:
+                    line += f" {record['rows_per_second']:>12.0f} rows/s"
+            if "allocated_bytes" in record:
+                line += f" {record['allocated_bytes'] / 2**20:+9.1f} MB"
+            lines.append(line)
+        return "\n".join(lines)
+
+    def finish(self):
+        if not self.enabled:
+            return
+        if self.trace_path:
+            import json
+
+            with open(self.trace_path, "w") as file:
+                json.dump({"stages": self.records}, file, indent=2)
+        print(self.summary())
+        if self.profile_stage:
+            print(f"cProfile stats for {self.profile_stage!r} in {self.profile_path}")
+
+
+instrumentation = Instrumentation()
+
+
+def stage(name):
+    return instrumentation.stage(name)
+
+
+def add_arguments(parser):
+    parser.add_argument("--trace", help="write per-stage timings to this JSON file")
+    parser.add_argument(
+        "--trace-memory",
+        action="store_true",
+        help="also record allocations per stage with tracemalloc (slower)",
+    )
+    parser.add_argument(
+        "--profile-stage", help="run cProfile over this stage, e.g. sort"
+    )
+    parser.add_argument(
+        "--profile-output", help="where to dump the cProfile stats (default: STAGE.prof)"
+    )
+
+
+def configure_from_args(args):
+    # Stages that run inside --jobs worker processes are not recorded
+    instrumentation.configure(
+        args.trace, args.trace_memory, args.profile_stage, args.profile_output
+    )
@@ -0,0 +1,101 @@
+import csv
+import os
+from collections import namedtuple
+from functools import lru_cache
+
+data_name = os.path.join("share", "portfolio-tracker", "instruments.csv")
+
+
+def find_instrument_file():
+    # Next to the code in a checkout or an editable install. `pip install .`
+    # installs it as data (see pyproject.toml), under the data path of the
+    # install scheme whose site-packages holds this module.
+    folder = os.path.dirname(os.path.abspath(__file__))
+    path = os.path.join(folder, "instruments.csv")
+    if os.path.exists(path):
+        return path
+    import sysconfig
+
+    for scheme in sysconfig.get_scheme_names():
+        paths = sysconfig.get_paths(scheme)
+        if os.path.realpath(paths["purelib"]) == os.path.realpath(folder):
+            installed = os.path.join(paths["data"], data_name)
+            if os.path.exists(installed):
+                return installed
+    return path
+
+
+instrument_file = find_instrument_file()
+
+# price_unit is the value of one quoted price unit in the quote currency,
+# e.g. 0.01 for London listings quoted in pence
+Instrument = namedtuple(
+    "Instrument", ["ticker", "exchange", "yahoo_symbol", "currency", "price_unit"]
+)
+
+
+def london_listing(ticker):
+    # Anything not in the instrument file is taken to be listed in London
+    # and quoted in pence, like most of the holdings
+    if ticker.endswith(".L"):
+        ticker = ticker[: -len(".L")]
+    return Instrument(ticker, "LSE", ticker + ".L", "GBP", 0.01)
+
+
+class InstrumentMaster:
+    # Instruments by broker ticker and by Yahoo symbol, so both the raw
+    # ticker of an export (or its original_ticker) and the tracker's
+    # suffixed one find the same instrument. Unknown tickers are cached on
+    # first lookup, so every lookup after that is one dict access.
+    def __init__(self, instruments=()):
+        self.instruments = {}
+        for instrument in instruments:
+            self.instruments[instrument.ticker] = instrument
+            self.instruments[instrument.yahoo_symbol] = instrument
+
+    @classmethod
+    def load(cls, path=instrument_file):
+        with open(path, newline="") as csvfile:
+            return cls(
+                Instrument(
+                    row["ticker"],
+                    row["exchange"],
+                    row["yahoo_symbol"] or row["ticker"],
+                    row["currency"],
+                    float(row["price_unit"] or 1),
+                )
+                for row in csv.DictReader(csvfile)
+            )
+
+    def __len__(self):
+        return len({instrument.ticker for instrument in self.instruments.values()})
+
+    def lookup(self, ticker):
+        instrument = self.instruments.get(ticker)
+        if instrument is None:
+            instrument = self.instruments[ticker] = london_listing(ticker)
+        return instrument
+
+    def resolve(self, tickers):
+        # Instruments of a whole column, e.g. a table's ticker categories
+        lookup = self.lookup
+        return [lookup(ticker) for ticker in tickers]
+
+
+@lru_cache(maxsize=None)
+def load_instruments(path=instrument_file):
+    # Read once per process
+    return InstrumentMaster.load(path)
+
+
+def instrument_for(ticker):
+    return load_instruments().lookup(ticker)
+
+
+@lru_cache(maxsize=None)
+def yahoo_symbol(ticker):
+    return instrument_for(ticker).yahoo_symbol
+
+
+def resolve(tickers):
+    return load_instruments().resolve(tickers)
@@ -0,0 +1,316 @@
+import argparse
+import sqlite3
+
+import numpy as np
+
+from dates import to_epoch
+from positions import as_of_epoch
+from transaction import external_flow_keywords
+from transaction_table import TransactionTable, categorical_columns, numeric_columns
+from writers import output_formats, write_targets
+
+batch_size = 10_000
+
+columns = ["id", "date", *categorical_columns, *numeric_columns, "comment", "source"]
+
+# Dates are microseconds since 1970-01-01 in broker local time, ids the raw
+# 16 byte digests, empty numbers NULL and comment NULL where it is the
+# default one (see Transaction.default_comment)
+schema = """
+CREATE TABLE IF NOT EXISTS transactions (
+    id BLOB PRIMARY KEY,
+    date INTEGER NOT NULL,
+    action TEXT,
+    type TEXT,
+    ticker TEXT,
+    original_ticker TEXT,
+    source_currency TEXT,
+    target_currency TEXT,
+    share_amount REAL,
+    share_price REAL,
+    exchange_rate REAL,
+    fee REAL,
+    total REAL,
+    comment TEXT,
+    source TEXT
+)
+"""
+indexes = {
+    "transactions_ticker_date": "transactions (ticker, date)",
+    "transactions_action_date": "transactions (action, date)",
+    "transactions_source": "transactions (source)",
+}
+
+
+def date_range(start=None, end=None):
+    # SQL condition and parameters for start <= date < end
+    conditions = []
+    parameters = []
+    if start is not None:
+        conditions.append("date >= ?")
+        parameters.append(to_epoch(start))
+    if end is not None:
+        conditions.append("date < ?")
+        parameters.append(to_epoch(end))
+    return conditions, parameters
+
+
+def where(conditions):
+    return " WHERE " + " AND ".join(conditions) if conditions else ""
+
+
+class Ledger:
+    # Every converted transaction, once, with the export it first came from.
+    # Rows keep the order they were added in, which for a batch is the order
+    # the converter sorts and dedupes them in.
+    def __init__(self, path):
+        # Transactions are begun and committed explicitly
+        self.connection = sqlite3.connect(path, isolation_level=None)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute("PRAGMA cache_size=-65536")
+        self.connection.execute(schema)
+        self.create_indexes()
+
+    def create_indexes(self):
+        for name, columns in indexes.items():
+            self.connection.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {columns}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+        return False
+
+    def close(self):
+        self.connection.close()
+
+    def __len__(self):
+        count = self.connection.execute("SELECT COUNT(*) FROM transactions")
+        return count.fetchone()[0]
+
+    def add(self, sourced_tables):
+        # Takes (source, TransactionTable) pairs and inserts them in one
+        # transaction; rows whose id is already in the ledger are skipped.
+        # Returns the number of rows added.
+        sourced_tables = list(sourced_tables)
+        before = len(self)
+        statement = (
+            f"INSERT OR IGNORE INTO transactions ({', '.join(columns)})"
+            f" VALUES ({', '.join('?' * len(columns))})"
+        )
+        # Loading more rows than the ledger holds is faster without the
+        # secondary indexes, which are rebuilt once at the end
+        bulk = sum(len(table) for _, table in sourced_tables) > before
+        self.connection.execute("BEGIN")
+        try:
+            if bulk:
+                for name in indexes:
+                    self.connection.execute(f"DROP INDEX IF EXISTS {name}")
+            for source, table in sourced_tables:
+                for start in range(0, len(table), batch_size):
+                    rows = table_rows(table, source, start, start + batch_size)
+                    self.connection.executemany(statement, rows)
+            if bulk:
+                self.create_indexes()
+            self.connection.execute("COMMIT")
+        except BaseException:
+            self.connection.execute("ROLLBACK")
+            raise
+        return len(self) - before
+
+    def table(
+        self, start=None, end=None, ticker=None, source=None, source_prefix=None
+    ):
+        # The matching transactions as a TransactionTable in date order, e.g.
+        # to write the CSV exports from the ledger. source_prefix selects one
+        # broker's exports, e.g. the adapter's prefix "TRADING212".
+        conditions, parameters = date_range(start, end)
+        if ticker is not None:
+            conditions.append("ticker = ?")
+            parameters.append(ticker)
+        if source is not None:
+            conditions.append("source = ?")
+            parameters.append(source)
+        if source_prefix is not None:
+            # Unlike LIKE, GLOB is case sensitive and "_" is no wildcard
+            conditions.append("source GLOB ?")
+            parameters.append(source_prefix + "*")
+        rows = self.connection.execute(
+            f"SELECT {', '.join(columns[:-1])} FROM transactions"
+            f"{where(conditions)} ORDER BY date, rowid",
+            parameters,
+        ).fetchall()
+        return table_from_rows(rows)
+
+    def holdings(self, as_of=None):
+        # {ticker: (shares, net amount invested)} like Positions.holdings
+        conditions = ["action IN ('BUY', 'SELL')"]
+        parameters = []
+        if as_of is not None:
+            conditions.append("date <= ?")
+            parameters.append(as_of_epoch(as_of))
+        rows = self.connection.execute(
+            "SELECT ticker, SUM(share_amount), SUM(total) FROM transactions"
+            f"{where(conditions)} GROUP BY ticker"
+            " HAVING ABS(SUM(share_amount)) > 1e-9 ORDER BY ticker",
+            parameters,
+        )
+        return {ticker: (shares, cost) for ticker, shares, cost in rows}
+
+    def cash_balance(self, as_of=None):
+        conditions = ["action = 'CASH'"]
+        parameters = []
+        if as_of is not None:
+            conditions.append("date <= ?")
+            parameters.append(as_of_epoch(as_of))
+        return self.connection.execute(
+            f"SELECT COALESCE(SUM(total), 0) FROM transactions{where(conditions)}",
+            parameters,
+        ).fetchone()[0]
+
+    def cash_flows(self, start=None, end=None, period="month"):
+        # Deposits and withdrawals by the owner per month (or year) as
+        # [(period, deposited, withdrawn)]
+        conditions, parameters = date_range(start, end)
+        keywords = ", ".join("?" * len(external_flow_keywords))
+        conditions.append(f"lower(type) IN ({keywords})")
+        parameters.extend(external_flow_keywords)
+        return self.connection.execute(
+            f"SELECT {period_sql(period)} AS period,"
+            " SUM(MAX(total, 0)), -SUM(MIN(total, 0))"
+            f" FROM transactions{where(conditions)} GROUP BY period ORDER BY period",
+            parameters,
+        ).fetchall()
+
+    def income(self, start=None, end=None, period="year"):
+        # Dividends and interest per period as [(period, type, amount)]
+        conditions, parameters = date_range(start, end)
+        conditions.append(
+            "(lower(type) LIKE 'dividend%' OR lower(type) LIKE 'interest%')"
+        )
+        return self.connection.execute(
+            f"SELECT {period_sql(period)} AS period, type, SUM(total)"
+            f" FROM transactions{where(conditions)}"
+            " GROUP BY period, type ORDER BY period, type",
+            parameters,
+        ).fetchall()
+
+    def fees(self, ticker=None, start=None, end=None):
+        # Fees paid on trades as {ticker: total fees}
+        conditions, parameters = date_range(start, end)
+        conditions.append("action IN ('BUY', 'SELL') AND fee > 0")
+        if ticker is not None:
+            conditions.append("ticker = ?")
+            parameters.append(ticker)
+        rows = self.connection.execute(
+            f"SELECT ticker, SUM(fee) FROM transactions{where(conditions)}"
+            " GROUP BY ticker ORDER BY ticker",
+            parameters,
+        )
+        return dict(rows.fetchall())
+
+    def sources(self):
+        return dict(
+            self.connection.execute(
+                "SELECT source, COUNT(*) FROM transactions"
+                " GROUP BY source ORDER BY source"
+            ).fetchall()
+        )
+
+
+def period_sql(period):
+    formats = {"day": "%Y-%m-%d", "month": "%Y-%m", "year": "%Y"}
+    return f"strftime('{formats[period]}', date / 1000000, 'unixepoch')"
+
+
+def table_rows(table, source, start, end):
+    indices = np.arange(start, min(end, len(table)))
+    values = [
+        [bytes(digest) for digest in table.ids[indices].tolist()],
+        table.dates_epoch[indices].tolist(),
+    ]
+    for name in categorical_columns:
+        categories = np.array(table.categories[name], dtype=object)
+        values.append(categories[table.codes[name][indices]].tolist())
+    for name in numeric_columns:
+        # NaN (an empty field) is stored as NULL
+        numbers = table.numbers[name][indices].tolist()
+        values.append([None if number != number else number for number in numbers])
+    values.append(table.comments[indices].tolist())
+    values.append([source] * len(indices))
+    return zip(*values)
+
+
+def table_from_rows(rows):
+    if not rows:
+        return TransactionTable.from_transactions([])
+    values = list(zip(*rows))
+    ids, dates = values[0], values[1]
+    codes = {}
+    categories = {}
+    for offset, name in enumerate(categorical_columns, start=2):
+        lookup = {}
+        codes[name] = np.array(
+            [lookup.setdefault(value, len(lookup)) for value in values[offset]],
+            dtype=np.int32,
+        )
+        categories[name] = list(lookup)
+    numbers = {}
+    first = 2 + len(categorical_columns)
+    for offset, name in enumerate(numeric_columns, start=first):
+        numbers[name] = np.array(values[offset], dtype=np.float64)
+    return TransactionTable(
+        np.array(dates, dtype=np.int64),
+        codes,
+        categories,
+        numbers,
+        np.array(values[-1], dtype=object),
+        np.frombuffer(b"".join(ids), dtype="V16"),
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Query the transaction ledger")
+    parser.add_argument("ledger", help="SQLite ledger file")
+    commands = parser.add_subparsers(dest="command", required=True)
+    holdings_parser = commands.add_parser("holdings")
+    holdings_parser.add_argument("--as-of", help="YYYY-MM-DD (default: now)")
+    flows_parser = commands.add_parser("cash-flows")
+    flows_parser.add_argument(
+        "--period", choices=["day", "month", "year"], default="month"
+    )
+    income_parser = commands.add_parser("income")
+    income_parser.add_argument(
+        "--period", choices=["day", "month", "year"], default="year"
+    )
+    fees_parser = commands.add_parser("fees")
+    fees_parser.add_argument("--ticker")
+    commands.add_parser("sources")
+    export_parser = commands.add_parser("export")
+    export_parser.add_argument("format", choices=sorted(output_formats))
+    export_parser.add_argument("path")
+    args = parser.parse_args()
+
+    with Ledger(args.ledger) as ledger:
+        if args.command == "holdings":
+            for ticker, (shares, cost) in ledger.holdings(args.as_of).items():
+                print(f"{ticker:<12} {shares:>16.6f} {cost:>14.2f}")
+            print(f"{'cash':<12} {ledger.cash_balance(args.as_of):>31.2f}")
+        elif args.command == "cash-flows":
+            for period, deposited, withdrawn in ledger.cash_flows(period=args.period):
+                print(f"{period:<10} {deposited:>14.2f} {withdrawn:>14.2f}")
+        elif args.command == "income":
+            for period, type, amount in ledger.income(period=args.period):
+                print(f"{period:<10} {type:<45} {amount:>12.2f}")
+        elif args.command == "fees":
+            for ticker, fees in ledger.fees(args.ticker).items():
+                print(f"{ticker:<12} {fees:>12.2f}")
+        elif args.command == "sources":
+            for source, count in ledger.sources().items():
+                print(f"{source:<40} {count:>8}")
+        elif args.command == "export":
+            table = ledger.table()
+            write_targets(table, [output_formats[args.format](args.path)])
+            print(f"Wrote {len(table)} transactions to {args.path}")
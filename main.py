@@ -1,140 +1,124 @@
+import argparse
 import csv
 import os
-from datetime import datetime
-from dateutil import parser
-from transaction import Transaction
+from collections import Counter
+
+import nutmeg
+from brokers import convert_file
+from instrumentation import add_arguments, configure_from_args, instrumentation, stage
+from ledger import Ledger
+from parallel import map_files
+from instruments import instrument_for
+from trading212 import derive_cash_transactions
+from transaction import report_unknown_types
+from transaction_table import TransactionTable
 
 # Define the input folder path
 input_folder = "/Users/jakub/Development/portfolio-tracker/input"
-us_stocks = ["AAPL", "MRNA", "BB", "GME", "BYND", "KODK"]
-
-print("---------------- NUTMEG ------------------")
-
-all_transactions = []
-
-csv_files = [
-    filename
-    for filename in os.listdir(input_folder)
-    if filename.startswith("NUTMEG_In") and filename.endswith(".csv")
-]
-
-# Iterate through the CSV files and append their transactions to the list
-for csv_file in csv_files:
-    file_path = os.path.join(input_folder, csv_file)
-    with open(file_path, newline="") as csvfile:
-        reader = csv.DictReader(csvfile)
-        for row in reader:
-            time = row["Date"]
-            asset = (
-                "$CASH"
-                if row["Description"].lower()
-                in ["dividend", "deposit", "interest on cash", "withdrawal"]
-                else row["Investment"]
-            )
-
-            try:
-                share_price = float(row["Share Price"])
-                num_shares = float(row["No. Shares"])
-            except ValueError:
-                share_price = 0.0
-                num_shares = 0.0
-
-            transaction = Transaction(
-                date=time,
-                type=row["Description"],
-                ticker=asset,
-                share_price=share_price,
-                share_amount=num_shares,
-                source_currency="GBP",
-                target_currency="GBP",
-                total=row["Total Value"],
-            )
-
-            all_transactions.append(transaction)
-
-csv_files = [
-    filename
-    for filename in os.listdir(input_folder)
-    if filename.startswith("NUTMEG_Tr") and filename.endswith(".csv")
-]
-
-for csv_file in csv_files:
-    file_path = os.path.join(input_folder, csv_file)
-    with open(file_path, newline="") as csvfile:
-        reader = csv.DictReader(csvfile)
-        for row in reader:
-            time = row["Date"]
-            asset = "$CASH"
-
-            transaction = Transaction(
-                date=time,
-                type=row["Description"],
-                ticker=asset,
-                source_currency="GBP",
-                target_currency="GBP",
-                total=row["Amount"],
-            )
-
-            all_transactions.append(transaction)
-
-
-print(f"{len(all_transactions)} total Nutmeg transactions")
-
 # Define the output CSV file path
-yahoo_nutmeg_csv_file = (
-    "/Users/jakub/Development/portfolio-tracker/output/yahoo_nutmeg.csv"
-)
-
-GBP_stocks = ["UESD", "GIL5", "DHYG", "JPSG"]
-
-with open(yahoo_nutmeg_csv_file, "w", newline="") as csvfile:
-    fieldnames = [
-        "Symbol",
-        "Date",
-        "Time",
-        "Trade Date",
-        "Purchase Price",
-        "Quantity",
-        "Comment",
+yahoo_nutmeg_csv_file = "/Users/jakub/Development/portfolio-tracker/output/yahoo_nutmeg.csv"
+
+
+def nutmeg_files():
+    return [
+        csv_file
+        for adapter in [nutmeg.investments, nutmeg.transactions]
+        for csv_file in adapter.list_files(input_folder)
     ]
-    writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-    writer.writeheader()
-
-    for transaction in all_transactions:
-        if not transaction.type in ["BUY", "SELL"]:
-            continue
-        item = {}
-        if transaction.asset == "$CASH":
-            item["Symbol"] = "$$CASH"
-            item["Purchase Price"] = 1
-            item["Quantity"] = transaction.total
-        elif (
-            not transaction.source_currency == "GBP"
-            or transaction.target_currency == "GBP"
-        ) and transaction.asset not in us_stocks:
-            item["Symbol"] = transaction.asset + ".L"
-            item["Purchase Price"] = (
-                round(float(transaction.share_price) * 100, 2)
-                if transaction.asset not in GBP_stocks
-                else round(float(transaction.share_price), 2)
-            )
-            if transaction.type == "BUY":
-                item["Quantity"] = transaction.amount
-            elif transaction.type == "SELL":
-                item["Quantity"] = -transaction.amount
-        else:
-            item["Symbol"] = transaction.asset
-            item["Purchase Price"] = transaction.share_price
-            if transaction.type == "BUY":
-                item["Quantity"] = transaction.amount
-            elif transaction.type == "SELL":
-                item["Quantity"] = -transaction.amount
-
-        item["Date"] = datetime.fromisoformat(transaction.time).strftime("%d/%m/%Y")
-        item["Time"] = (
-            datetime.fromisoformat(transaction.time).strftime("%H:%M") + " BST"
-        )
-        item["Trade Date"] = datetime.fromisoformat(transaction.time).strftime("%Y%m%d")
-
-        item["Comment"] = transaction.transaction
-        writer.writerow(item)
+
+
+def read_nutmeg(jobs=1, ledger_file=None):
+    # Workers hand back columnar tables, which pickle far smaller than Transactions
+    input_files = nutmeg_files()
+    file_paths = [os.path.join(input_folder, csv_file) for csv_file in input_files]
+    tables = map_files(convert_file, file_paths, jobs)
+    if ledger_file:
+        with stage("ledger") as current, Ledger(ledger_file) as ledger:
+            current.rows = ledger.add(zip(input_files, tables))
+
+    all_transactions = []
+    for table in tables:
+        all_transactions.extend(table)
+    return all_transactions
+
+
+def nutmeg_table(jobs=1):
+    # Date sorted Nutmeg transactions for valuation. The exports don't list the
+    # cash a purchase or sale moves, so it's derived like for Trading212 and
+    # the cash balance doesn't count invested money twice.
+    file_paths = [os.path.join(input_folder, csv_file) for csv_file in nutmeg_files()]
+    table = TransactionTable.concat(*map_files(convert_file, file_paths, jobs))
+    cash = TransactionTable.from_transactions(derive_cash_transactions(table))
+    return TransactionTable.concat(table, cash).sort_by_date()
+
+
+def write_yahoo_nutmeg(all_transactions):
+    with open(yahoo_nutmeg_csv_file, "w", newline="") as csvfile:
+        fieldnames = [
+            "Symbol",
+            "Date",
+            "Time",
+            "Trade Date",
+            "Purchase Price",
+            "Quantity",
+            "Comment",
+        ]
+        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
+        writer.writeheader()
+
+        for transaction in all_transactions:
+            if transaction.action not in ["BUY", "SELL"]:
+                continue
+            item = {}
+            instrument = instrument_for(transaction.ticker)
+            if (
+                not transaction.source_currency == "GBP"
+                or transaction.target_currency == "GBP"
+            ) and instrument.exchange == "LSE":
+                # Yahoo quotes London listings in their price unit, mostly pence
+                item["Symbol"] = instrument.yahoo_symbol
+                item["Purchase Price"] = round(
+                    transaction.share_price / instrument.price_unit, 2
+                )
+            else:
+                item["Symbol"] = transaction.ticker
+                item["Purchase Price"] = transaction.share_price
+            # Sales already have a negative share amount
+            item["Quantity"] = transaction.share_amount
+
+            item["Date"] = transaction.timestamp.strftime("%d/%m/%Y")
+            item["Time"] = transaction.timestamp.strftime("%H:%M") + " BST"
+            item["Trade Date"] = transaction.timestamp.strftime("%Y%m%d")
+
+            item["Comment"] = transaction.type
+            writer.writerow(item)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert Nutmeg exports")
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=1,
+        help="number of processes used to parse exports (default: 1)",
+    )
+    parser.add_argument(
+        "--ledger",
+        metavar="PATH",
+        help="also add the transactions to this SQLite ledger",
+    )
+    add_arguments(parser)
+    args = parser.parse_args()
+    configure_from_args(args)
+
+    print("---------------- NUTMEG ------------------")
+
+    all_transactions = read_nutmeg(args.jobs, args.ledger)
+
+    print(f"{len(all_transactions)} total Nutmeg transactions")
+    report_unknown_types(Counter(transaction.type for transaction in all_transactions))
+
+    with stage("write_yahoo") as current:
+        current.rows = len(all_transactions)
+        write_yahoo_nutmeg(all_transactions)
+    instrumentation.finish()
@@ -0,0 +1,135 @@
+import argparse
+import csv
+import os
+
+import numpy as np
+
+import brokers
+import trading212
+from columnar import read_columnar, write_columnar
+from dedupe import SeenIndex
+from ids import table_ids
+from ledger import Ledger
+
+
+def new_ids(table):
+    return table_ids(table.dates_epoch, table.codes, table.categories, table.numbers)
+
+
+def legacy_ids(table):
+    # MD5 IDs the rows had before binary IDs, worked out row by row
+    return [transaction.legacy_digest for transaction in table]
+
+
+def add_table(mapping, table):
+    ids = (bytes(id) for id in new_ids(table).tolist())
+    mapping.update(zip(legacy_ids(table), ids))
+
+
+def mapping_from_exports(input_folder):
+    # {old ID: new ID} of every transaction converted from the exports,
+    # including the derived Trading212 cash rows
+    mapping = {}
+    for adapter in brokers.load_adapters().values():
+        for csv_file in adapter.list_files(input_folder):
+            file_path = os.path.join(input_folder, csv_file)
+            if adapter is trading212.adapter:
+                tables = trading212.convert_file(file_path)
+            else:
+                tables = [brokers.convert_file(file_path)]
+            for table in tables:
+                add_table(mapping, table)
+    return mapping
+
+
+def migrate_ledger(path, mapping):
+    # The ledger keeps every field, so its rows are rehashed directly. Rows
+    # already migrated are left as they are.
+    with Ledger(path) as ledger:
+        table = ledger.table()
+        old = [bytes(id) for id in table.ids.tolist()]
+        new = [bytes(id) for id in new_ids(table).tolist()]
+        changes = [
+            (new_id, old_id) for old_id, new_id in zip(old, new) if old_id != new_id
+        ]
+        ledger.connection.execute("BEGIN")
+        ledger.connection.executemany(
+            "UPDATE OR REPLACE transactions SET id = ? WHERE id = ?", changes
+        )
+        ledger.connection.execute("COMMIT")
+    mapping.update(zip(old, new))
+    return len(changes)
+
+
+def migrate_columnar(path, mapping):
+    table = read_columnar(path)
+    ids = new_ids(table)
+    changed = int(np.count_nonzero(ids != table.ids))
+    mapping.update(
+        zip(
+            (bytes(id) for id in table.ids.tolist()),
+            (bytes(id) for id in ids.tolist()),
+        )
+    )
+    table.ids = ids
+    write_columnar(table, path)
+    return changed
+
+
+def migrate_seen_index(path, mapping):
+    # Returns (migrated, unknown): IDs replaced by their new ones and IDs not
+    # in the mapping, which are kept
+    seen_index = SeenIndex(path)
+    try:
+        old = [id for id in seen_index.ids if id in mapping and mapping[id] != id]
+        unknown = sum(1 for id in seen_index.ids if id not in mapping)
+        with seen_index.connection:
+            seen_index.connection.executemany(
+                "INSERT OR IGNORE INTO seen_ids (id) VALUES (?)",
+                ((mapping[id],) for id in old),
+            )
+            seen_index.connection.executemany(
+                "DELETE FROM seen_ids WHERE id = ?", ((id,) for id in old)
+            )
+    finally:
+        seen_index.close()
+    return len(old), unknown
+
+
+def write_mapping(mapping, path):
+    with open(path, "w", newline="") as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerow(["old_id", "new_id"])
+        for old_id, new_id in mapping.items():
+            writer.writerow([old_id.hex(), new_id.hex()])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Move stored MD5 transaction IDs over to the binary IDs"
+    )
+    parser.add_argument(
+        "--input",
+        default=trading212.input_folder,
+        help="folder of the broker exports the stored IDs came from",
+    )
+    parser.add_argument("--seen-index", help="SQLite seen-ID index to migrate")
+    parser.add_argument("--ledger", help="SQLite ledger to migrate")
+    parser.add_argument(
+        "--columnar", action="append", default=[], help=".parquet or .arrow file"
+    )
+    parser.add_argument("--map", help="write the old_id,new_id pairs to this CSV")
+    args = parser.parse_args()
+
+    mapping = mapping_from_exports(args.input)
+    print(f"{len(mapping)} IDs from the exports in {args.input}")
+    if args.ledger:
+        print(f"{migrate_ledger(args.ledger, mapping)} ledger rows migrated")
+    for path in args.columnar:
+        print(f"{migrate_columnar(path, mapping)} rows migrated in {path}")
+    if args.seen_index:
+        migrated, unknown = migrate_seen_index(args.seen_index, mapping)
+        print(f"{migrated} seen IDs migrated, {unknown} not found in the exports")
+    if args.map:
+        write_mapping(mapping, args.map)
+        print(f"ID map written to {args.map}")
@@ -0,0 +1,50 @@
+from brokers import BrokerAdapter, register
+
+# Investment rows with these descriptions move cash rather than a fund
+cash_descriptions = ["dividend", "deposit", "interest on cash", "withdrawal"]
+
+
+def prepare_investment(fields):
+    if fields["type"].lower() in cash_descriptions:
+        fields["ticker"] = "$CASH"
+    try:
+        fields["share_price"] = float(fields["share_price"])
+        fields["share_amount"] = float(fields["share_amount"])
+    except ValueError:
+        fields["share_price"] = 0.0
+        fields["share_amount"] = 0.0
+
+
+# Each Nutmeg export uses one fixed "Date" format, detected from its first row
+investments = register(
+    BrokerAdapter(
+        "nutmeg_investments",
+        broker="Nutmeg",
+        prefix="NUTMEG_In",
+        date_column="Date",
+        columns={
+            "type": "Description",
+            "ticker": "Investment",
+            "share_price": "Share Price",
+            "share_amount": "No. Shares",
+            "total": "Total Value",
+        },
+        constants={"source_currency": "GBP", "target_currency": "GBP"},
+        prepare=prepare_investment,
+    )
+)
+
+transactions = register(
+    BrokerAdapter(
+        "nutmeg_transactions",
+        broker="Nutmeg",
+        prefix="NUTMEG_Tr",
+        date_column="Date",
+        columns={"type": "Description", "total": "Amount"},
+        constants={
+            "ticker": "$CASH",
+            "source_currency": "GBP",
+            "target_currency": "GBP",
+        },
+    )
+)
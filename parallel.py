@@ -0,0 +1,15 @@
+from concurrent.futures import ProcessPoolExecutor
+
+
+def map_files(convert_file, file_paths, jobs=1):
+    # Converts every file with convert_file, in worker processes when jobs > 1.
+    # Results come back in the order of file_paths, so the output doesn't
+    # depend on which worker finishes first. convert_file must be a module
+    # level function and should return compact tables rather than lists of
+    # Transaction objects, which are slow to pickle.
+    file_paths = list(file_paths)
+    if jobs <= 1 or len(file_paths) <= 1:
+        return [convert_file(file_path) for file_path in file_paths]
+
+    with ProcessPoolExecutor(max_workers=min(jobs, len(file_paths))) as executor:
+        return list(executor.map(convert_file, file_paths))
@@ -0,0 +1,278 @@
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from dates import EPOCH, MICROSECONDS_PER_DAY, from_epoch
+
+# One matched (part of a) disposal. rule is the method, or for Section 104 the
+# HMRC matching rule used: "same-day", "bed-and-breakfast" or "section-104".
+Disposal = namedtuple(
+    "Disposal", ["ticker", "date", "quantity", "proceeds", "cost", "gain", "rule"]
+)
+Holding = namedtuple(
+    "Holding", ["ticker", "quantity", "cost", "value", "unrealized_gain"]
+)
+
+methods = ["fifo", "average", "section104"]
+
+epsilon = 1e-9
+
+
+class Lots:
+    # The BUY and SELL rows of one ticker as parallel arrays in date order.
+    # Quantities are positive, amounts are in GBP and include fees: the cost
+    # of a purchase, the net proceeds of a sale.
+    def __init__(self, ticker, dates, quantities, amounts, is_buy):
+        self.ticker = ticker
+        self.dates = dates
+        self.quantities = quantities
+        self.amounts = amounts
+        self.is_buy = is_buy
+
+
+def row_rates(table, rates=None):
+    # Exchange rate (price currency per GBP) of every row: its own where the
+    # export has one, else the day's rate from an fx.FxRates table, else 1
+    row_rates = table.numbers["exchange_rate"]
+    missing = np.isnan(row_rates) | (row_rates == 0)
+    if rates is not None and missing.any():
+        rows = np.flatnonzero(missing)
+        looked_up = 1.0 / rates.convert_table(table.take(rows), np.ones(len(rows)))
+        row_rates = row_rates.copy()
+        row_rates[rows] = looked_up
+        missing = np.isnan(row_rates) | (row_rates == 0)
+    return np.where(missing, 1.0, row_rates)
+
+
+def gbp_amounts(table, rates=None):
+    # Trading212 "Total" is already in the account currency. Anything else is
+    # converted with the row's exchange rate (see row_rates).
+    converted = np.abs(table.share_amounts) * table.share_prices / row_rates(
+        table, rates
+    )
+    in_gbp = table.isin("target_currency", ["GBP"])
+    return np.where(in_gbp, np.abs(table.totals), converted)
+
+
+def split_lots(table, rates=None):
+    table = table.filter(action=["BUY", "SELL"])
+    # A GBP Total already includes the fees (see derive_cash_transactions);
+    # only amounts worked out from the share price still need them
+    fees = np.where(
+        table.isin("target_currency", ["GBP"]), 0.0, np.nan_to_num(table.fees)
+    )
+    amounts = gbp_amounts(table, rates)
+    is_buy = table.isin("action", ["BUY"])
+    amounts = np.where(is_buy, amounts + fees, amounts - fees)
+    quantities = np.abs(table.share_amounts)
+
+    codes = table.codes["ticker"]
+    order = np.argsort(codes, kind="stable")
+    sorted_codes = codes[order]
+    starts = np.flatnonzero(np.diff(sorted_codes, prepend=-1))
+    ends = np.append(starts[1:], len(order))
+    for start, end in zip(starts, ends):
+        rows = order[start:end]
+        yield Lots(
+            table.categories["ticker"][sorted_codes[start]],
+            table.dates_epoch[rows],
+            quantities[rows],
+            amounts[rows],
+            is_buy[rows],
+        )
+
+
+def fifo(lots):
+    # The FIFO cost of the first Q shares sold is the cumulative purchase cost
+    # curve evaluated at Q, so every sale is costed at once with np.interp.
+    # A sale can only use shares bought before it and the part sold beyond that
+    # has no cost basis: with M[i] = min(M[i-1] + q[i], available[i]), M - Q
+    # is a running minimum, Q being the cumulative quantity sold.
+    bought = np.cumsum(np.where(lots.is_buy, lots.quantities, 0), dtype=np.float64)
+    spent = np.cumsum(np.where(lots.is_buy, lots.amounts, 0), dtype=np.float64)
+    bought = np.concatenate([[0.0], bought])
+    spent = np.concatenate([[0.0], spent])
+    sells = np.flatnonzero(~lots.is_buy)
+    sold = np.cumsum(lots.quantities[sells])
+    available = bought[sells]
+    sold += np.minimum(np.minimum.accumulate(available - sold), 0.0)
+    cost_curve = np.interp(sold, bought, spent)
+    costs = np.diff(cost_curve, prepend=0.0)
+
+    disposals = [
+        Disposal(
+            lots.ticker,
+            from_epoch(lots.dates[index]),
+            float(lots.quantities[index]),
+            float(lots.amounts[index]),
+            float(cost),
+            float(lots.amounts[index] - cost),
+            "fifo",
+        )
+        for index, cost in zip(sells, costs)
+    ]
+    matched = sold[-1] if len(sold) else 0.0
+    remaining = bought[-1] - matched
+    remaining_cost = spent[-1] - (cost_curve[-1] if len(cost_curve) else 0.0)
+    return disposals, remaining, remaining_cost
+
+
+def average_cost(lots):
+    # Each sale is costed at the average cost of the shares held at the time,
+    # which depends on every earlier sale, so this runs as a loop over the
+    # ticker's plain arrays rather than over Transaction objects
+    shares = 0.0
+    cost = 0.0
+    disposals = []
+    rows = zip(
+        lots.dates.tolist(),
+        lots.quantities.tolist(),
+        lots.amounts.tolist(),
+        lots.is_buy.tolist(),
+    )
+    for date, quantity, amount, is_buy in rows:
+        if is_buy:
+            shares += quantity
+            cost += amount
+            continue
+        matched = min(quantity, shares)
+        sale_cost = cost * matched / shares if shares > epsilon else 0.0
+        shares -= matched
+        cost = cost - sale_cost if shares > epsilon else 0.0
+        disposals.append(
+            Disposal(
+                lots.ticker,
+                from_epoch(date),
+                quantity,
+                amount,
+                sale_cost,
+                amount - sale_cost,
+                "average",
+            )
+        )
+    return disposals, shares, cost
+
+
+def section104(lots):
+    # HMRC share matching: disposals are matched first with acquisitions on the
+    # same day, then with acquisitions in the following 30 days (bed and
+    # breakfast), and only then with the Section 104 pool at its average cost.
+    # Matching works on day totals, as the rules treat all of a day's
+    # acquisitions (and disposals) as one.
+    days, day_index = np.unique(
+        lots.dates // MICROSECONDS_PER_DAY, return_inverse=True
+    )
+    count = len(days)
+
+    def day_totals(values):
+        return np.bincount(day_index, values, count)
+
+    buy_quantity = day_totals(np.where(lots.is_buy, lots.quantities, 0))
+    buy_cost = day_totals(np.where(lots.is_buy, lots.amounts, 0))
+    sell_quantity = day_totals(np.where(lots.is_buy, 0, lots.quantities))
+    sell_proceeds = day_totals(np.where(lots.is_buy, 0, lots.amounts))
+
+    matches = []  # (day, quantity, cost, rule)
+
+    same_day = np.minimum(buy_quantity, sell_quantity)
+    same_day_cost = np.divide(
+        buy_cost * same_day, buy_quantity, out=np.zeros(count), where=buy_quantity > 0
+    )
+    for day in np.flatnonzero(same_day > epsilon):
+        matches.append((day, same_day[day], same_day_cost[day], "same-day"))
+    buy_left = buy_quantity - same_day
+    buy_cost_left = buy_cost - same_day_cost
+    sell_left = sell_quantity - same_day
+
+    # Earlier disposals get the first claim on later acquisitions
+    for day in np.flatnonzero(sell_left > epsilon):
+        first = np.searchsorted(days, days[day] + 1)
+        last = np.searchsorted(days, days[day] + 30, side="right")
+        for later in range(first, last):
+            if sell_left[day] <= epsilon:
+                break
+            if buy_left[later] <= epsilon:
+                continue
+            quantity = min(sell_left[day], buy_left[later])
+            cost = buy_cost_left[later] * quantity / buy_left[later]
+            matches.append((day, quantity, cost, "bed-and-breakfast"))
+            sell_left[day] -= quantity
+            buy_left[later] -= quantity
+            buy_cost_left[later] -= cost
+
+    pool_quantity = 0.0
+    pool_cost = 0.0
+    for day in range(count):
+        pool_quantity += buy_left[day]
+        pool_cost += buy_cost_left[day]
+        if sell_left[day] <= epsilon:
+            continue
+        quantity = min(sell_left[day], pool_quantity)
+        cost = pool_cost * quantity / pool_quantity if pool_quantity > epsilon else 0.0
+        # Shares sold beyond the pool have no known cost
+        matches.append((day, sell_left[day], cost, "section-104"))
+        pool_quantity -= quantity
+        pool_cost = pool_cost - cost if pool_quantity > epsilon else 0.0
+
+    disposals = []
+    for day, quantity, cost, rule in sorted(matches, key=lambda match: match[0]):
+        proceeds = sell_proceeds[day] * quantity / sell_quantity[day]
+        disposals.append(
+            Disposal(
+                lots.ticker,
+                EPOCH + timedelta(days=int(days[day])),
+                float(quantity),
+                float(proceeds),
+                float(cost),
+                float(proceeds - cost),
+                rule,
+            )
+        )
+    return disposals, pool_quantity, pool_cost
+
+
+calculators = {"fifo": fifo, "average": average_cost, "section104": section104}
+
+
+def realized_gains(table, method="fifo", rates=None):
+    # Returns every disposal in a date sorted, deduplicated TransactionTable
+    # and what is left of each position as (ticker -> (quantity, cost)).
+    # rates, an fx.FxRates, converts trades the export has no rate for.
+    calculate = calculators[method]
+    disposals = []
+    remaining = {}
+    for lots in split_lots(table, rates):
+        ticker_disposals, quantity, cost = calculate(lots)
+        disposals.extend(ticker_disposals)
+        if quantity > epsilon:
+            remaining[lots.ticker] = (float(quantity), float(cost))
+    disposals.sort(key=lambda disposal: disposal.date)
+    return disposals, remaining
+
+
+def unrealized_gains(remaining, prices):
+    # prices maps ticker to its GBP price per share; tickers without a price
+    # are left out
+    holdings = []
+    for ticker, (quantity, cost) in sorted(remaining.items()):
+        price = prices.get(ticker)
+        if price is None:
+            continue
+        value = quantity * price
+        holdings.append(Holding(ticker, quantity, cost, value, value - cost))
+    return holdings
+
+
+def gains_by_tax_year(disposals):
+    # UK tax years run from 6 April to 5 April and are named by their start year
+    totals = {}
+    for disposal in disposals:
+        date = disposal.date
+        year = date.year if (date.month, date.day) >= (4, 6) else date.year - 1
+        totals[year] = totals.get(year, 0.0) + disposal.gain
+    return totals
+
+
+def tax_year_bounds(year):
+    return datetime(year, 4, 6), datetime(year + 1, 4, 6)
@@ -0,0 +1,158 @@
+from datetime import date, datetime, time
+
+import numpy as np
+
+from dates import to_epoch
+
+CASH_TICKER = "$$CASH"
+
+
+def as_of_epoch(value):
+    # A plain date (or a "YYYY-MM-DD" string) means the end of that day
+    if isinstance(value, str):
+        if len(value) > 10:
+            value = datetime.fromisoformat(value)
+        else:
+            value = date.fromisoformat(value)
+    if not isinstance(value, datetime):
+        value = datetime.combine(value, time.max)
+    return to_epoch(value)
+
+
+class TickerHistory:
+    # Running totals of one ticker after each of its transactions, so the
+    # position at any moment is a binary search over dates. Arrays grow by
+    # doubling so appending new transactions is amortised O(1) per row.
+    def __init__(self, dates, shares, cost):
+        self.length = len(dates)
+        self.dates = dates
+        self.shares = shares
+        self.cost = cost
+
+    @classmethod
+    def from_deltas(cls, dates, share_deltas, cost_deltas):
+        return cls(
+            np.array(dates, dtype=np.int64),
+            np.cumsum(share_deltas, dtype=np.float64),
+            np.cumsum(cost_deltas, dtype=np.float64),
+        )
+
+    def deltas(self):
+        shares = self.shares[: self.length]
+        cost = self.cost[: self.length]
+        return (
+            self.dates[: self.length],
+            np.diff(shares, prepend=0.0),
+            np.diff(cost, prepend=0.0),
+        )
+
+    def reserve(self, extra):
+        needed = self.length + extra
+        if needed <= len(self.dates):
+            return
+        capacity = max(needed, 2 * len(self.dates), 16)
+        for name in ["dates", "shares", "cost"]:
+            old = getattr(self, name)
+            new = np.empty(capacity, dtype=old.dtype)
+            new[: self.length] = old[: self.length]
+            setattr(self, name, new)
+
+    def append(self, dates, share_deltas, cost_deltas):
+        if self.length and dates[0] < self.dates[self.length - 1]:
+            # Rows from before the end of the history, so rebuild it in order
+            old_dates, old_shares, old_cost = self.deltas()
+            all_dates = np.concatenate([old_dates, dates])
+            order = np.argsort(all_dates, kind="stable")
+            rebuilt = TickerHistory.from_deltas(
+                all_dates[order],
+                np.concatenate([old_shares, share_deltas])[order],
+                np.concatenate([old_cost, cost_deltas])[order],
+            )
+            self.length = rebuilt.length
+            self.dates = rebuilt.dates
+            self.shares = rebuilt.shares
+            self.cost = rebuilt.cost
+            return
+
+        count = len(dates)
+        start_shares = self.shares[self.length - 1] if self.length else 0.0
+        start_cost = self.cost[self.length - 1] if self.length else 0.0
+        self.reserve(count)
+        end = self.length + count
+        self.dates[self.length : end] = dates
+        self.shares[self.length : end] = start_shares + np.cumsum(share_deltas)
+        self.cost[self.length : end] = start_cost + np.cumsum(cost_deltas)
+        self.length = end
+
+    def at(self, epoch):
+        index = np.searchsorted(self.dates[: self.length], epoch, side="right")
+        if index == 0:
+            return 0.0, 0.0
+        return float(self.shares[index - 1]), float(self.cost[index - 1])
+
+
+class Positions:
+    # Share holdings and net amount invested per ticker, plus the $$CASH
+    # balance, built from a date sorted, deduplicated TransactionTable
+    def __init__(self):
+        self.histories = {}
+
+    @classmethod
+    def from_table(cls, table):
+        positions = cls()
+        positions.append(table)
+        return positions
+
+    def append(self, table):
+        # Rows with no action (unknown types) don't move shares or cash
+        table = table.filter(action=["BUY", "SELL", "CASH"])
+        if not len(table):
+            return
+
+        # A stable sort by ticker keeps each ticker's rows in date order
+        codes = table.codes["ticker"]
+        order = np.argsort(codes, kind="stable")
+        sorted_codes = codes[order]
+        starts = np.flatnonzero(np.diff(sorted_codes, prepend=-1))
+        ends = np.append(starts[1:], len(order))
+        dates = table.dates_epoch[order]
+        share_deltas = table.share_amounts[order]
+        cost_deltas = table.totals[order]
+
+        for start, end in zip(starts, ends):
+            ticker = table.categories["ticker"][sorted_codes[start]]
+            history = self.histories.get(ticker)
+            if history is None:
+                self.histories[ticker] = TickerHistory.from_deltas(
+                    dates[start:end], share_deltas[start:end], cost_deltas[start:end]
+                )
+            else:
+                history.append(
+                    dates[start:end], share_deltas[start:end], cost_deltas[start:end]
+                )
+
+    def holding(self, ticker, as_of):
+        # Returns (shares, net amount invested) of ticker at the given moment
+        history = self.histories.get(ticker)
+        if history is None:
+            return 0.0, 0.0
+        return history.at(as_of_epoch(as_of))
+
+    def holdings(self, as_of, tolerance=1e-9):
+        # Every ticker with a non-zero position, without the cash balance
+        epoch = as_of_epoch(as_of)
+        holdings = {}
+        for ticker, history in self.histories.items():
+            if ticker == CASH_TICKER:
+                continue
+            shares, cost = history.at(epoch)
+            if abs(shares) > tolerance:
+                holdings[ticker] = (shares, cost)
+        return holdings
+
+    def cash_balance(self, as_of):
+        return self.holding(CASH_TICKER, as_of)[0]
+
+    @property
+    def tickers(self):
+        return sorted(ticker for ticker in self.histories if ticker != CASH_TICKER)
@@ -0,0 +1,220 @@
+import argparse
+import csv
+import json
+import os
+
+import numpy as np
+
+from dates import to_epoch
+from instruments import instrument_for
+
+price_folder = "/Users/jakub/Development/portfolio-tracker/prices"
+store_folder = "/Users/jakub/Development/portfolio-tracker/output/prices"
+
+store_version = 1
+
+# Columns of a daily price file, as downloaded from Yahoo Finance
+price_columns = ["Open", "High", "Low", "Close", "Adj Close", "Volume"]
+columns = ["open", "high", "low", "close", "adj_close", "volume"]
+
+
+def price_scale(ticker):
+    # Multiplier from quoted prices to the instrument's currency, 0.01 for
+    # London listings quoted in pence (see instruments.csv)
+    return instrument_for(ticker).price_unit
+
+
+def ticker_from_filename(filename):
+    # VUSA.L.csv holds the prices of VUSA.L
+    return filename[: -len(".csv")]
+
+
+def to_price(value):
+    try:
+        return float(value)
+    except ValueError:
+        return np.nan
+
+
+def read_price_file(file_path):
+    dates = []
+    values = []
+    with open(file_path, newline="") as csvfile:
+        reader = csv.DictReader(csvfile)
+        present = [name for name in price_columns if name in reader.fieldnames]
+        for row in reader:
+            dates.append(to_epoch(row["Date"]))
+            values.append(
+                [
+                    to_price(row[name]) if name in present else np.nan
+                    for name in price_columns
+                ]
+            )
+    dates = np.array(dates, dtype=np.int64)
+    values = np.array(values, dtype=np.float64).reshape(-1, len(price_columns))
+
+    # Yahoo lists days without a quote, which would hide the previous close
+    quoted = ~np.isnan(values[:, price_columns.index("Close")])
+    dates = dates[quoted]
+    values = values[quoted]
+
+    # Files are usually in date order already; keep the last quote of a day
+    order = np.argsort(dates, kind="stable")
+    dates = dates[order]
+    values = values[order]
+    last = np.ones(len(dates), dtype=bool)
+    last[:-1] = dates[1:] != dates[:-1]
+    # Stored column-major so every column is one contiguous block
+    return dates[last], np.ascontiguousarray(values[last].T)
+
+
+class PriceSeries:
+    # Daily prices of one ticker, memory-mapped from the store: slices are
+    # views into the mapped files, so nothing is read until it is used
+    def __init__(self, ticker, dates, values):
+        self.ticker = ticker
+        self.dates = dates
+        self.values = values
+        self.scale = price_scale(ticker)
+
+    def __len__(self):
+        return len(self.dates)
+
+    def column(self, name):
+        return self.values[columns.index(name)]
+
+    def window(self, start=None, end=None):
+        # Rows dated start <= date < end as (dates, values) views
+        first = 0
+        last = len(self.dates)
+        if start is not None:
+            first = np.searchsorted(self.dates, to_epoch(start))
+        if end is not None:
+            last = np.searchsorted(self.dates, to_epoch(end))
+        return self.dates[first:last], self.values[:, first:last]
+
+    def closes_at(self, epochs, column="close"):
+        # Last quoted price (in pounds for London listings) on or before each
+        # epoch; NaN before the first quote
+        epochs = np.asarray(epochs, dtype=np.int64)
+        if not len(self.dates):
+            return np.full(epochs.shape, np.nan)
+        index = np.searchsorted(self.dates, epochs, side="right") - 1
+        prices = self.column(column)[np.maximum(index, 0)] * self.scale
+        return np.where(index >= 0, prices, np.nan)
+
+
+class PriceStore:
+    # Per-ticker columnar .npy files plus an index of the price files they
+    # were built from, so a run only re-parses price files that changed
+    def __init__(self, folder, files=None):
+        self.folder = folder
+        self.files = files if files is not None else {}
+        self.series_cache = {}
+
+    @property
+    def index_path(self):
+        return os.path.join(self.folder, "index.json")
+
+    @classmethod
+    def open(cls, folder):
+        path = os.path.join(folder, "index.json")
+        if not os.path.exists(path):
+            return cls(folder)
+        with open(path) as file:
+            data = json.load(file)
+        if data.get("version") != store_version:
+            return cls(folder)
+        return cls(folder, data["files"])
+
+    def save(self):
+        os.makedirs(self.folder, exist_ok=True)
+        temporary = self.index_path + ".tmp"
+        with open(temporary, "w") as file:
+            json.dump({"version": store_version, "files": self.files}, file, indent=2)
+        os.replace(temporary, self.index_path)
+
+    def column_paths(self, ticker):
+        base = os.path.join(self.folder, ticker)
+        return base + ".dates.npy", base + ".values.npy"
+
+    def ingest(self, input_folder):
+        # Returns the tickers whose prices were (re)loaded
+        updated = []
+        for filename in sorted(os.listdir(input_folder)):
+            if not filename.endswith(".csv"):
+                continue
+            ticker = ticker_from_filename(filename)
+            file_path = os.path.join(input_folder, filename)
+            stat = os.stat(file_path)
+            entry = self.files.get(ticker)
+            if (
+                entry is not None
+                and entry["size"] == stat.st_size
+                and entry["mtime"] == stat.st_mtime_ns
+                and all(os.path.exists(path) for path in self.column_paths(ticker))
+            ):
+                continue
+
+            dates, values = read_price_file(file_path)
+            os.makedirs(self.folder, exist_ok=True)
+            for path, array in zip(self.column_paths(ticker), [dates, values]):
+                # Written next to the target and renamed, so a reader never
+                # maps a half written file
+                temporary = path + ".tmp"
+                with open(temporary, "wb") as file:
+                    np.save(file, array)
+                os.replace(temporary, path)
+            self.files[ticker] = {
+                "file": filename,
+                "size": stat.st_size,
+                "mtime": stat.st_mtime_ns,
+                "rows": len(dates),
+            }
+            self.series_cache.pop(ticker, None)
+            updated.append(ticker)
+        if updated:
+            self.save()
+        return updated
+
+    @property
+    def tickers(self):
+        return sorted(self.files)
+
+    def __contains__(self, ticker):
+        return ticker in self.files
+
+    def series(self, ticker):
+        series = self.series_cache.get(ticker)
+        if series is None:
+            if ticker not in self.files:
+                raise KeyError(f"No prices for {ticker}")
+            dates_path, values_path = self.column_paths(ticker)
+            series = PriceSeries(
+                ticker,
+                np.load(dates_path, mmap_mode="r"),
+                np.load(values_path, mmap_mode="r"),
+            )
+            self.series_cache[ticker] = series
+        return series
+
+    def window(self, ticker, start=None, end=None):
+        return self.series(ticker).window(start, end)
+
+    def prices_at(self, ticker, epochs, column="close"):
+        return self.series(ticker).closes_at(epochs, column)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Load daily price CSVs into the local price store"
+    )
+    parser.add_argument(
+        "--input", default=price_folder, help="folder of TICKER.csv files"
+    )
+    parser.add_argument("--store", default=store_folder)
+    args = parser.parse_args()
+
+    store = PriceStore.open(args.store)
+    updated = store.ingest(args.input)
+    print(f"Updated {len(updated)} of {len(store.tickers)} tickers")
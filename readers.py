@@ -0,0 +1,164 @@
+import csv
+import importlib.util
+import os
+from functools import lru_cache
+from itertools import islice
+
+# Set to "csv" or "pyarrow" to read every export with that backend; by default
+# pyarrow reads the exports it's worth importing for
+backend_variable = "PORTFOLIO_TRACKER_CSV_BACKEND"
+
+batch_size = 65_536
+# Smaller files are read with the csv module in less time than importing
+# pyarrow takes
+arrow_min_bytes = 1 << 20
+
+
+class ColumnBatch:
+    # Consecutive rows of an export, one list of strings per column read
+    def __init__(self, columns, length):
+        self.columns = columns
+        self.length = length
+
+    def __len__(self):
+        return self.length
+
+    def column(self, name):
+        return self.columns[name]
+
+
+class ArrowBatch:
+    # A pyarrow RecordBatch of string columns; a column only becomes Python
+    # strings when it's asked for
+    def __init__(self, record_batch):
+        self.record_batch = record_batch
+
+    def __len__(self):
+        return self.record_batch.num_rows
+
+    def column(self, name):
+        return self.record_batch.column(name).to_pylist()
+
+
+class CsvBackend:
+    # The csv module. Blank lines are skipped and short rows padded with None,
+    # like csv.DictReader does.
+    def read(self, file_path, columns):
+        return list(self.batches(file_path, columns))
+
+    def batches(self, file_path, columns, size=batch_size, skip=0):
+        # skip drops that many rows first, e.g. the ones another backend
+        # already read
+        with open(file_path, newline="") as csvfile:
+            reader = csv.reader(csvfile)
+            header = next(reader, [])
+            if not header:
+                return
+            position = {column: index for index, column in enumerate(header)}
+            indices = [position[column] for column in columns]
+            width = len(header)
+            rows = (row for row in reader if row)
+            if skip:
+                next(islice(rows, skip, skip), None)
+            while True:
+                chunk = list(islice(rows, size))
+                if not chunk:
+                    return
+                if min(map(len, chunk)) < width:
+                    chunk = [row + [None] * (width - len(row)) for row in chunk]
+                yield ColumnBatch(
+                    {
+                        column: [row[index] for row in chunk]
+                        for column, index in zip(columns, indices)
+                    },
+                    len(chunk),
+                )
+
+
+class ArrowBackend:
+    # pyarrow.csv parses only the projected columns, as strings, in C++ (and on
+    # several threads for a whole file). Batches are pyarrow's blocks rather
+    # than size rows. Files it can't read, e.g. with rows of the wrong length,
+    # go through the csv module from the first row it couldn't hand back.
+    def __init__(self):
+        import pyarrow
+        import pyarrow.csv
+
+        self.pa = pyarrow
+        self.pa_csv = pyarrow.csv
+        self.fallback = CsvBackend()
+
+    def options(self, columns):
+        return {
+            "parse_options": self.pa_csv.ParseOptions(newlines_in_values=True),
+            "convert_options": self.pa_csv.ConvertOptions(
+                include_columns=columns,
+                column_types={column: self.pa.string() for column in columns},
+                strings_can_be_null=False,
+            ),
+        }
+
+    def read(self, file_path, columns):
+        try:
+            table = self.pa_csv.read_csv(file_path, **self.options(columns))
+        except self.pa.ArrowInvalid:
+            return self.fallback.read(file_path, columns)
+        return [ArrowBatch(record_batch) for record_batch in table.to_batches()]
+
+    def batches(self, file_path, columns, size=batch_size, skip=0):
+        rows = 0
+        try:
+            with self.pa_csv.open_csv(file_path, **self.options(columns)) as reader:
+                for record_batch in reader:
+                    if rows + record_batch.num_rows <= skip:
+                        rows += record_batch.num_rows
+                        continue
+                    record_batch = record_batch.slice(max(skip - rows, 0))
+                    rows += record_batch.num_rows
+                    yield ArrowBatch(record_batch)
+        except self.pa.ArrowInvalid:
+            yield from self.fallback.batches(file_path, columns, size, max(rows, skip))
+
+
+# Backends by name; a new one needs read and batches methods returning
+# objects with __len__ and column(name)
+backends = {"csv": CsvBackend, "pyarrow": ArrowBackend}
+
+
+def available_backends():
+    # pyarrow is optional and only imported once a file is read with it
+    names = ["csv"]
+    if importlib.util.find_spec("pyarrow") is not None:
+        names.append("pyarrow")
+    return names
+
+
+@lru_cache(maxsize=None)
+def load_backend(name):
+    return backends[name]()
+
+
+def backend_for(file_path):
+    name = os.environ.get(backend_variable)
+    if name:
+        if name not in available_backends():
+            raise ValueError(
+                f"{backend_variable}={name} isn't one of"
+                f" {', '.join(available_backends())}"
+            )
+        return load_backend(name)
+    if "pyarrow" in available_backends() and (
+        os.path.getsize(file_path) >= arrow_min_bytes
+    ):
+        return load_backend("pyarrow")
+    return load_backend("csv")
+
+
+def read_batches(file_path, columns):
+    # Every row of the export as ColumnBatches holding only these columns
+    return backend_for(file_path).read(file_path, columns)
+
+
+def iter_batches(file_path, columns, size=batch_size):
+    # The same, read lazily so memory use doesn't grow with the file
+    return backend_for(file_path).batches(file_path, columns, size)
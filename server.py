@@ -0,0 +1,416 @@
+import argparse
+import asyncio
+import csv
+import io
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from http import HTTPStatus
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+
+import trading212
+from cli import add_input_argument
+from columnar import read_columnar
+from dates import to_epoch
+from ledger import Ledger
+from parallel import map_files
+from positions import Positions, as_of_epoch
+from transaction import csv_fields, yahoo_fields
+from transaction_table import categorical_columns
+
+default_limit = 1000
+max_limit = 100_000
+# Rows serialised per executor call while streaming a response
+chunk_rows = 2000
+max_request_bytes = 64 * 1024
+
+json_fields = [field for field in csv_fields if field != "unencoded"]
+
+
+class RequestError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class TransactionIndex:
+    # The date sorted, deduplicated transactions with the lookups the API
+    # needs built once: row numbers per ticker (each list in date order) and
+    # the running positions of every ticker for holdings as of any date
+    def __init__(self, table):
+        self.table = table
+        self.positions = Positions.from_table(table)
+        codes = table.codes["ticker"]
+        order = np.argsort(codes, kind="stable")
+        sorted_codes = codes[order]
+        starts = np.flatnonzero(np.diff(sorted_codes, prepend=-1))
+        ends = np.append(starts[1:], len(order))
+        self.ticker_rows = {
+            table.categories["ticker"][sorted_codes[start]]: order[start:end]
+            for start, end in zip(starts, ends)
+        }
+
+    def select(self, tickers=None, actions=None, start=None, end=None):
+        # Row numbers in date order; the date range is half open
+        table = self.table
+        if tickers:
+            parts = [self.ticker_rows.get(ticker, []) for ticker in tickers]
+            rows = np.sort(np.concatenate(parts)).astype(np.int64)
+            dates = table.dates_epoch[rows]
+        else:
+            rows = None
+            dates = table.dates_epoch
+        low = 0 if start is None else np.searchsorted(dates, to_epoch(start))
+        high = len(dates) if end is None else np.searchsorted(dates, to_epoch(end))
+        rows = np.arange(low, high) if rows is None else rows[low:high]
+        if actions:
+            categories = table.categories["action"]
+            wanted = [code for code, value in enumerate(categories) if value in actions]
+            rows = rows[np.isin(table.codes["action"][rows], wanted)]
+        return rows
+
+    def holdings(self, as_of):
+        holdings = self.positions.holdings(as_of)
+        return {
+            "as_of": as_of,
+            "holdings": [
+                {"ticker": ticker, "shares": shares, "invested": cost}
+                for ticker, (shares, cost) in sorted(holdings.items())
+            ],
+            "cash": self.positions.cash_balance(as_of),
+        }
+
+    def cash(self, as_of):
+        return {"as_of": as_of, "cash": self.positions.cash_balance(as_of)}
+
+
+def load_transactions(input_folder, columnar_file=None, ledger_file=None, jobs=1):
+    if columnar_file:
+        table = read_columnar(columnar_file)
+    elif ledger_file:
+        # convert --ledger adds the Nutmeg exports to the same ledger
+        with Ledger(ledger_file) as ledger:
+            table = ledger.table(source_prefix=trading212.adapter.prefix)
+    else:
+        file_paths = [
+            os.path.join(input_folder, csv_file)
+            for csv_file in trading212.adapter.list_files(input_folder)
+        ]
+        tables = map_files(trading212.convert_file, file_paths, jobs)
+        table, _ = trading212.combine(
+            [cash for cash, _ in tables], [share for _, share in tables]
+        )
+    return table.sort_by_date()
+
+
+def iso_dates(dates_epoch):
+    # Like datetime.isoformat: microseconds only when there are any
+    strings = np.datetime_as_string(dates_epoch.view("datetime64[us]")).astype(object)
+    whole = dates_epoch % 1_000_000 == 0
+    strings[whole] = [string[:-7] for string in strings[whole]]
+    return strings.tolist()
+
+
+def optional_floats(values):
+    return [None if value != value else value for value in values.tolist()]
+
+
+def transactions_json(table, rows):
+    # Comma separated JSON objects, one per row, with the values the rows'
+    # Transactions would have, built a column at a time
+    table = table.take(rows)
+    columns = {"date": iso_dates(table.dates_epoch)}
+    for name in categorical_columns:
+        columns[name] = table.decode(name).tolist()
+    for name in ["share_amount", "share_price", "total"]:
+        columns[name] = table.numbers[name].tolist()
+    for name in ["exchange_rate", "fee"]:
+        columns[name] = optional_floats(table.numbers[name])
+    columns["comment"] = [
+        comment
+        if comment is not None
+        else f"{type} - {abs(amount)} {ticker} @ {price} on {date}"
+        for comment, type, amount, ticker, price, date in zip(
+            table.comments.tolist(),
+            columns["type"],
+            columns["share_amount"],
+            columns["ticker"],
+            columns["share_price"],
+            columns["date"],
+        )
+    ]
+    columns["id"] = [digest.hex() for digest in table.ids.tolist()]
+    values = zip(*[columns[field] for field in json_fields])
+    return json.dumps([dict(zip(json_fields, row)) for row in values])[1:-1].encode()
+
+
+def yahoo_csv(table, rows, header=False):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if header:
+        writer.writerow(yahoo_fields)
+    writer.writerows(transaction.yahoo_row() for transaction in table.take(rows))
+    return buffer.getvalue().encode()
+
+
+def parse_date(query, name):
+    value = query.get(name)
+    if value is None:
+        return None
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        raise RequestError(HTTPStatus.BAD_REQUEST, f"{name} must be an ISO date")
+
+
+def parse_int(query, name, default, maximum=None):
+    value = query.get(name)
+    if value is None:
+        return default
+    try:
+        number = int(value)
+    except ValueError:
+        raise RequestError(HTTPStatus.BAD_REQUEST, f"{name} must be an integer")
+    if number < 0 or (maximum is not None and number > maximum):
+        raise RequestError(HTTPStatus.BAD_REQUEST, f"{name} is out of range")
+    return number
+
+
+def parse_as_of(query):
+    as_of = query.get("as_of") or datetime.now().isoformat(timespec="seconds")
+    try:
+        as_of_epoch(as_of)
+    except ValueError:
+        raise RequestError(HTTPStatus.BAD_REQUEST, "as_of must be an ISO date")
+    return as_of
+
+
+def split_list(query, name):
+    value = query.get(name)
+    return value.split(",") if value else None
+
+
+class Server:
+    # A small HTTP/1.1 server on asyncio streams. Connections are kept alive
+    # between requests. Lookups and serialisation run in a thread pool so the
+    # event loop keeps accepting and answering requests meanwhile, and large
+    # responses are sent in chunks as they are produced.
+    def __init__(self, index, workers=None):
+        self.index = index
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.routes = {
+            "/transactions": self.transactions,
+            "/holdings": self.holdings,
+            "/cash": self.cash,
+            "/export/yahoo": self.export_yahoo,
+        }
+
+    async def run_blocking(self, function, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, function, *args)
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b"\r\n\r\n")
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    break
+                except asyncio.LimitOverrunError:
+                    await self.send_error(
+                        writer, HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE, "Too large"
+                    )
+                    break
+                lines = head.decode("latin-1").split("\r\n")
+                try:
+                    method, target, version = lines[0].split(" ")
+                except ValueError:
+                    await self.send_error(writer, HTTPStatus.BAD_REQUEST, "Bad request")
+                    break
+                headers = {}
+                for line in lines[1:]:
+                    name, _, value = line.partition(":")
+                    if name:
+                        headers[name.strip().lower()] = value.strip()
+                try:
+                    length = int(headers.get("content-length") or 0)
+                except ValueError:
+                    length = -1
+                if length < 0:
+                    await self.send_error(
+                        writer, HTTPStatus.BAD_REQUEST, "Bad Content-Length"
+                    )
+                    break
+                if length:
+                    try:
+                        await reader.readexactly(length)
+                    except asyncio.IncompleteReadError:
+                        break
+                keep_alive = (
+                    headers.get("connection", "").lower() != "close"
+                    and version == "HTTP/1.1"
+                )
+                # HTTP/1.0 clients can't decode chunked bodies
+                await self.respond(writer, method, target, version == "HTTP/1.1")
+                if not keep_alive:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def respond(self, writer, method, target, chunked=True):
+        url = urlsplit(target)
+        handler = self.routes.get(url.path)
+        if handler is None:
+            await self.send_error(writer, HTTPStatus.NOT_FOUND, "Not found")
+            return
+        if method != "GET":
+            await self.send_error(
+                writer, HTTPStatus.METHOD_NOT_ALLOWED, "Only GET is supported"
+            )
+            return
+        query = {name: values[-1] for name, values in parse_qs(url.query).items()}
+        try:
+            await handler(writer, query, chunked)
+        except RequestError as error:
+            await self.send_error(writer, error.status, str(error))
+
+    async def send(self, writer, status, content_type, body):
+        writer.write(
+            f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+            f"Content-Type: {content_type}\r\n"
+            f"Content-Length: {len(body)}\r\n\r\n".encode()
+            + body
+        )
+        await writer.drain()
+
+    async def send_json(self, writer, data, status=HTTPStatus.OK):
+        await self.send(writer, status, "application/json", json.dumps(data).encode())
+
+    async def send_error(self, writer, status, message):
+        await self.send_json(writer, {"error": message}, status)
+
+    async def send_chunked(self, writer, content_type, chunks, chunked=True):
+        # chunks is an async iterator of bytes; each one is sent as soon as
+        # it has been produced. Without chunked encoding (HTTP/1.0) the body
+        # ends when the connection is closed.
+        writer.write(
+            f"HTTP/1.1 200 OK\r\nContent-Type: {content_type}\r\n".encode()
+            + (
+                b"Transfer-Encoding: chunked\r\n\r\n"
+                if chunked
+                else b"Connection: close\r\n\r\n"
+            )
+        )
+        async for chunk in chunks:
+            if chunk:
+                if chunked:
+                    chunk = b"%x\r\n%s\r\n" % (len(chunk), chunk)
+                writer.write(chunk)
+                await writer.drain()
+        if chunked:
+            writer.write(b"0\r\n\r\n")
+            await writer.drain()
+
+    async def transactions(self, writer, query, chunked=True):
+        # GET /transactions?ticker=AAPL,MSFT&action=BUY&start=2023-01-01
+        #     &end=2024-01-01&offset=0&limit=1000
+        tickers = split_list(query, "ticker")
+        actions = split_list(query, "action")
+        start = parse_date(query, "start")
+        end = parse_date(query, "end")
+        offset = parse_int(query, "offset", 0)
+        limit = parse_int(query, "limit", default_limit, max_limit)
+        rows = await self.run_blocking(self.index.select, tickers, actions, start, end)
+        page = rows[offset : offset + limit]
+        next_offset = offset + limit if offset + limit < len(rows) else None
+        table = self.index.table
+
+        async def chunks():
+            yield (
+                f'{{"total": {len(rows)}, "offset": {offset}, "limit": {limit},'
+                f' "next_offset": {json.dumps(next_offset)}, "transactions": ['
+            ).encode()
+            for start in range(0, len(page), chunk_rows):
+                chunk = await self.run_blocking(
+                    transactions_json, table, page[start : start + chunk_rows]
+                )
+                yield (b"," if start else b"") + chunk
+            yield b"]}"
+
+        await self.send_chunked(writer, "application/json", chunks(), chunked)
+
+    async def holdings(self, writer, query, chunked=True):
+        # GET /holdings?as_of=2024-03-31
+        data = await self.run_blocking(self.index.holdings, parse_as_of(query))
+        await self.send_json(writer, data)
+
+    async def cash(self, writer, query, chunked=True):
+        # GET /cash?as_of=2024-03-31
+        data = await self.run_blocking(self.index.cash, parse_as_of(query))
+        await self.send_json(writer, data)
+
+    async def export_yahoo(self, writer, query, chunked=True):
+        # GET /export/yahoo?ticker=AAPL&start=...&end=..., the rows yahoo.csv
+        # would have
+        rows = await self.run_blocking(
+            self.index.select,
+            split_list(query, "ticker"),
+            None,
+            parse_date(query, "start"),
+            parse_date(query, "end"),
+        )
+        table = self.index.table
+
+        async def chunks():
+            yield await self.run_blocking(yahoo_csv, table, rows[:0], True)
+            for start in range(0, len(rows), chunk_rows):
+                yield await self.run_blocking(
+                    yahoo_csv, table, rows[start : start + chunk_rows]
+                )
+
+        await self.send_chunked(writer, "text/csv", chunks(), chunked)
+
+    async def serve(self, host, port):
+        server = await asyncio.start_server(
+            self.handle_connection, host, port, limit=max_request_bytes
+        )
+        print(f"Serving {len(self.index.table)} transactions on http://{host}:{port}")
+        async with server:
+            await server.serve_forever()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Serve transactions, holdings and cash over HTTP"
+    )
+    add_input_argument(parser)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8212)
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument(
+        "--columnar", metavar="PATH", help="load a .parquet or .arrow file"
+    )
+    source.add_argument("--ledger", metavar="PATH", help="load an SQLite ledger")
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=1,
+        help="number of processes used to parse exports (default: 1)",
+    )
+    parser.add_argument(
+        "--workers", type=int, help="threads for lookups and serialisation"
+    )
+    args = parser.parse_args()
+
+    # Without --columnar or --ledger the Trading212 exports are converted
+    table = load_transactions(args.input, args.columnar, args.ledger, args.jobs)
+    server = Server(TransactionIndex(table), args.workers)
+    try:
+        asyncio.run(server.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,63 @@
+import heapq
+from collections import Counter
+from itertools import groupby
+from operator import attrgetter
+
+from dedupe import DedupeReport
+from writers import OutputWriter
+
+by_timestamp = attrgetter("timestamp")
+
+
+def ensure_date_order(transactions, source):
+    previous = None
+    for transaction in transactions:
+        if previous is not None and transaction.timestamp < previous:
+            raise ValueError(
+                f"{source} is not in date order, it can't be converted in streaming mode"
+            )
+        previous = transaction.timestamp
+        yield transaction
+
+
+def stream_transactions(sources, derive_cash_transactions, report, type_counts):
+    # Each source must already be sorted by date, so the merged stream is too.
+    # Rows sharing a timestamp are emitted cash first, in the same order as a
+    # stable sort of cash + share transactions would give. IDs include the date,
+    # so dupes can only occur within one timestamp and only that group's IDs
+    # have to be remembered.
+    merged = heapq.merge(
+        *(ensure_date_order(transactions, source) for source, transactions in sources.items()),
+        key=by_timestamp,
+    )
+    index = 0
+    for _, group in groupby(merged, key=by_timestamp):
+        share_transactions = list(group)
+        seen = {}
+        for transaction in [
+            *derive_cash_transactions(share_transactions),
+            *share_transactions,
+        ]:
+            report.total += 1
+            type_counts[transaction.type] += 1
+            if transaction.digest in seen:
+                report.add_dupe(transaction, index, seen[transaction.digest])
+            else:
+                seen[transaction.digest] = index
+                report.unique += 1
+                yield transaction
+            index += 1
+
+
+def stream_convert(sources, derive_cash_transactions, targets):
+    # sources maps a name (used in errors) to an iterator of share transactions,
+    # targets are the writers.Target outputs to write
+    report = DedupeReport()
+    type_counts = Counter()
+
+    with OutputWriter(targets) as writer:
+        writer.write_all(
+            stream_transactions(sources, derive_cash_transactions, report, type_counts)
+        )
+
+    return report, type_counts
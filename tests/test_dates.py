@@ -0,0 +1,24 @@
+from datetime import datetime
+
+import pytest
+
+from dates import DateParser
+
+
+@pytest.mark.parametrize(
+    "values",
+    [["25/01/2023", "03/02/2023"], ["03/02/2023", "25/01/2023"]],
+)
+def test_slash_dates_dont_depend_on_row_order(values):
+    parse = DateParser()
+    parsed = dict(zip(values, map(parse, values)))
+    # Like dateutil: month first unless the first number can't be a month
+    assert parsed["03/02/2023"] == datetime(2023, 3, 2)
+    assert parsed["25/01/2023"] == datetime(2023, 1, 25)
+
+
+def test_detected_format_is_used_for_later_values():
+    parse = DateParser()
+    assert parse("02-Jan-20") == datetime(2020, 1, 2)
+    assert parse("15-Mar-21") == datetime(2021, 3, 15)
+    assert parse("2021-03-15T10:00:00") == datetime(2021, 3, 15, 10)
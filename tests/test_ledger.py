@@ -0,0 +1,22 @@
+from ledger import Ledger
+from transaction import Transaction
+from transaction_table import TransactionTable
+
+
+def deposit(date, total):
+    return TransactionTable.from_transactions(
+        [Transaction(date=date, type="Deposit", total=total, target_currency="GBP")]
+    )
+
+
+def test_table_selects_one_brokers_exports(tmp_path):
+    with Ledger(str(tmp_path / "ledger.db")) as ledger:
+        ledger.add(
+            [
+                ("TRADING212_0.csv", deposit("2024-01-01T10:00:00", 100.0)),
+                ("NUTMEG_Transactions.csv", deposit("2024-01-02T10:00:00", 50.0)),
+            ]
+        )
+        assert len(ledger.table()) == 2
+        table = ledger.table(source_prefix="TRADING212")
+        assert list(table.totals) == [100.0]
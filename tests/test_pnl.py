@@ -0,0 +1,167 @@
+from datetime import datetime
+
+import pytest
+
+from pnl import gains_by_tax_year, realized_gains, tax_year_bounds
+from transaction import Transaction
+from transaction_table import TransactionTable
+
+
+def trade(date, type, shares, total, ticker="AAPL", fee=None):
+    # A GBP trade; total is what was paid or received, fees included
+    return Transaction(
+        date=date,
+        type=type,
+        ticker=ticker,
+        share_amount=shares,
+        share_price=total / shares,
+        source_currency="GBP",
+        target_currency="GBP",
+        fee=fee,
+        total=total,
+    )
+
+
+def buy(date, shares, total, ticker="AAPL", fee=None):
+    return trade(date, "Market buy", shares, total, ticker, fee)
+
+
+def sell(date, shares, total, ticker="AAPL", fee=None):
+    return trade(date, "Market sell", shares, total, ticker, fee)
+
+
+def gains(method, *transactions):
+    table = TransactionTable.from_transactions(transactions).sort_by_date()
+    return realized_gains(table, method)
+
+
+def summary(disposals):
+    return [
+        (disposal.quantity, pytest.approx(disposal.cost), disposal.rule)
+        for disposal in disposals
+    ]
+
+
+def test_fifo_interpolates_sales_across_lots():
+    disposals, remaining = gains(
+        "fifo",
+        buy("2024-01-01T10:00:00", 10, 100.0),
+        buy("2024-01-02T10:00:00", 10, 200.0),
+        sell("2024-01-03T10:00:00", 5, 90.0),
+        sell("2024-01-04T10:00:00", 10, 250.0),
+    )
+    # 5 from the first lot, then its other 5 and 5 of the second
+    assert summary(disposals) == [(5.0, 50.0, "fifo"), (10.0, 150.0, "fifo")]
+    assert disposals[1].gain == pytest.approx(100.0)
+    assert remaining["AAPL"] == pytest.approx((5.0, 100.0))
+
+
+def test_fifo_sale_beyond_holding_has_no_cost():
+    disposals, remaining = gains(
+        "fifo",
+        buy("2024-01-01T10:00:00", 10, 100.0),
+        sell("2024-01-02T10:00:00", 15, 150.0),
+        buy("2024-01-03T10:00:00", 10, 300.0),
+    )
+    # The later purchase can't cover a sale made before it
+    assert summary(disposals) == [(15.0, 100.0, "fifo")]
+    assert remaining["AAPL"] == pytest.approx((10.0, 300.0))
+
+
+def test_gbp_totals_already_include_fees():
+    disposals, _ = gains(
+        "fifo",
+        buy("2024-01-01T10:00:00", 10, 1001.5, fee=1.5),
+        sell("2024-01-02T10:00:00", 10, 998.5, fee=1.5),
+    )
+    assert summary(disposals) == [(10.0, 1001.5, "fifo")]
+    assert disposals[0].proceeds == pytest.approx(998.5)
+    assert disposals[0].gain == pytest.approx(-3.0)
+
+
+def test_fees_are_added_to_converted_amounts():
+    # Priced in dollars at 1.25 to the pound, so the fee isn't in the amount
+    usd_buy = Transaction(
+        date="2024-01-01T10:00:00",
+        type="Market buy",
+        ticker="AAPL",
+        share_amount=10,
+        share_price=125.0,
+        source_currency="GBP",
+        target_currency="USD",
+        exchange_rate="1.25",
+        fee=1.5,
+        total=1001.5,
+    )
+    disposals, _ = gains("fifo", usd_buy, sell("2024-01-02T10:00:00", 10, 1100.0))
+    assert summary(disposals) == [(10.0, 1001.5, "fifo")]
+
+
+def test_average_cost():
+    disposals, remaining = gains(
+        "average",
+        buy("2024-01-01T10:00:00", 10, 100.0),
+        buy("2024-01-02T10:00:00", 10, 200.0),
+        sell("2024-01-03T10:00:00", 10, 200.0),
+    )
+    assert summary(disposals) == [(10.0, 150.0, "average")]
+    assert remaining["AAPL"] == pytest.approx((10.0, 150.0))
+
+
+def test_section104_matches_same_day_first():
+    disposals, remaining = gains(
+        "section104",
+        buy("2024-01-01T10:00:00", 10, 100.0),
+        buy("2024-02-01T09:00:00", 5, 75.0),
+        sell("2024-02-01T15:00:00", 8, 160.0),
+    )
+    # 5 against the same day purchase, 3 from the pool at 10 a share
+    assert summary(disposals) == [
+        (5.0, 75.0, "same-day"),
+        (3.0, 30.0, "section-104"),
+    ]
+    assert sum(disposal.proceeds for disposal in disposals) == pytest.approx(160.0)
+    assert remaining["AAPL"] == pytest.approx((7.0, 70.0))
+
+
+def test_section104_bed_and_breakfast_within_30_days():
+    disposals, remaining = gains(
+        "section104",
+        buy("2024-01-01T10:00:00", 10, 100.0),
+        sell("2024-03-01T10:00:00", 10, 200.0),
+        buy("2024-03-31T10:00:00", 4, 60.0),
+        buy("2024-04-01T10:00:00", 6, 120.0),
+    )
+    # The purchase 30 days later is matched, the one 31 days later isn't
+    assert summary(disposals) == [
+        (4.0, 60.0, "bed-and-breakfast"),
+        (6.0, 60.0, "section-104"),
+    ]
+    assert remaining["AAPL"] == pytest.approx((10.0, 160.0))
+
+
+def test_tickers_are_matched_separately():
+    disposals, remaining = gains(
+        "fifo",
+        buy("2024-01-01T10:00:00", 10, 100.0, "AAPL"),
+        buy("2024-01-01T11:00:00", 10, 500.0, "GME"),
+        sell("2024-01-02T10:00:00", 10, 120.0, "AAPL"),
+    )
+    assert [(disposal.ticker, disposal.gain) for disposal in disposals] == [
+        ("AAPL", pytest.approx(20.0))
+    ]
+    assert list(remaining) == ["GME"]
+
+
+def test_tax_years_start_on_6_april():
+    disposals, _ = gains(
+        "fifo",
+        buy("2023-01-01T10:00:00", 10, 100.0),
+        sell("2023-04-05T10:00:00", 5, 60.0),
+        sell("2023-04-06T10:00:00", 5, 70.0),
+    )
+    assert gains_by_tax_year(disposals) == {
+        2022: pytest.approx(10.0),
+        2023: pytest.approx(20.0),
+    }
+    assert tax_year_bounds(2023) == (datetime(2023, 4, 6), datetime(2024, 4, 6))
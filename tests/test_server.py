@@ -0,0 +1,79 @@
+import asyncio
+import json
+
+import pytest
+
+from server import Server, TransactionIndex
+from transaction import Transaction
+from transaction_table import TransactionTable
+
+
+def exchange(request, index=None):
+    # Sends a raw request to a server of these transactions; returns the reply
+    async def run():
+        server = await asyncio.start_server(
+            Server(index).handle_connection, "127.0.0.1", 0
+        )
+        port = server.sockets[0].getsockname()[1]
+        async with server:
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.write(request)
+            # Nothing more is sent, so a reply only waits for this request
+            writer.write_eof()
+            reply = await asyncio.wait_for(reader.read(), 5)
+            writer.close()
+            return reply
+
+    return asyncio.run(run())
+
+
+@pytest.mark.parametrize("length", [b"abc", b"-5", b""])
+def test_bad_content_length_is_a_bad_request(length):
+    reply = exchange(
+        b"GET /missing HTTP/1.1\r\nContent-Length: " + length + b"\r\n\r\n"
+    )
+    if length:
+        assert reply.startswith(b"HTTP/1.1 400 ")
+        assert b"Bad Content-Length" in reply
+    else:
+        # An empty header counts as no body
+        assert reply.startswith(b"HTTP/1.1 404 ")
+
+
+def test_body_shorter_than_content_length_closes_the_connection():
+    reply = exchange(b"GET /missing HTTP/1.0\r\nContent-Length: 10\r\n\r\nabc")
+    assert reply == b""
+
+
+def deposits_index():
+    return TransactionIndex(
+        TransactionTable.from_transactions(
+            [
+                Transaction(
+                    date=f"2024-01-0{day}T10:00:00",
+                    type="Deposit",
+                    total=100.0,
+                    target_currency="GBP",
+                )
+                for day in range(1, 4)
+            ]
+        )
+    )
+
+
+def test_http_1_0_responses_are_not_chunked():
+    reply = exchange(b"GET /transactions HTTP/1.0\r\n\r\n", deposits_index())
+    head, body = reply.split(b"\r\n\r\n", 1)
+    assert head.startswith(b"HTTP/1.1 200 ")
+    assert b"Transfer-Encoding" not in head
+    assert json.loads(body)["total"] == 3
+
+
+def test_http_1_1_responses_are_chunked():
+    reply = exchange(
+        b"GET /transactions HTTP/1.1\r\nConnection: close\r\n\r\n",
+        deposits_index(),
+    )
+    head, body = reply.split(b"\r\n\r\n", 1)
+    assert b"Transfer-Encoding: chunked" in head
+    assert body.endswith(b"0\r\n\r\n")
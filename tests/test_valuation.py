@@ -0,0 +1,83 @@
+import numpy as np
+import pytest
+
+import main
+from transaction import Transaction
+from transaction_table import TransactionTable
+from valuation import value_table, xirr
+
+
+def cash(date, type, total):
+    return Transaction(
+        date=date, type=type, source_currency="GBP", target_currency="GBP", total=total
+    )
+
+
+def trade(date, type, shares, total, ticker="AAPL"):
+    return Transaction(
+        date=date,
+        type=type,
+        ticker=ticker,
+        share_amount=shares,
+        share_price=total / shares,
+        source_currency="GBP",
+        target_currency="GBP",
+        total=total,
+    )
+
+
+def test_xirr_of_one_year():
+    assert xirr([0.0, 1.0], [-100.0, 110.0]) == pytest.approx(0.1)
+    assert xirr([0.0, 1.0], [-100.0, 50.0]) == pytest.approx(-0.5)
+
+
+def test_xirr_finds_roots_inside_one_grid_cell():
+    # -100 + 230 / (1 + r) - 132 / (1 + r) ** 2 is zero at r = 10% and 20%,
+    # which the first grid can't tell apart; the lowest rate is returned
+    assert xirr([0.0, 1.0, 2.0], [-100.0, 230.0, -132.0]) == pytest.approx(0.1)
+
+
+def test_xirr_without_a_sign_change_is_nan():
+    assert np.isnan(xirr([0.0, 1.0], [100.0, 110.0]))
+    assert np.isnan(xirr([0.0, 1.0], [-100.0, -110.0]))
+
+
+def test_returns_of_a_sale_after_a_year():
+    table = TransactionTable.from_transactions(
+        [
+            cash("2023-01-02T09:00:00", "Deposit", 1000.0),
+            cash("2023-01-02T10:00:00", "Withdrawal (share purchase)", 1000.0),
+            trade("2023-01-02T10:00:00", "Market buy", 10, 1000.0),
+            trade("2024-01-02T10:00:00", "Market sell", 10, 1100.0),
+            cash("2024-01-02T10:00:00", "Deposit (share sale)", 1100.0),
+        ]
+    ).sort_by_date()
+    valuation = value_table(table)
+    assert len(valuation) == 366
+    # Valued at the buying price until the sale
+    assert valuation.nav[0] == pytest.approx(1000.0)
+    assert valuation.nav[-2] == pytest.approx(1000.0)
+    assert valuation.nav[-1] == pytest.approx(1100.0)
+    assert valuation.twr() == pytest.approx(0.1)
+    assert valuation.twr(annualised=True) == pytest.approx(0.1)
+    assert valuation.mwr() == pytest.approx(0.1)
+
+
+def test_nutmeg_trades_move_its_cash(tmp_path, monkeypatch):
+    # Nutmeg exports list purchases and sales without the cash they moved
+    (tmp_path / "NUTMEG_Investments.csv").write_text(
+        "Date,Investment,Description,Share Price,No. Shares,Total Value,Pot\n"
+        "02-Jan-23,VUSA,Purchase,100.0,10.0,1000.0,Pot 1\n"
+        "02-Jan-24,VUSA,Sale,110.0,10.0,1100.0,Pot 1\n"
+    )
+    (tmp_path / "NUTMEG_Transactions.csv").write_text(
+        "Date,Description,Amount,Pot\n01-Jan-23,Deposit,1000.0,Pot 1\n"
+    )
+    monkeypatch.setattr(main, "input_folder", str(tmp_path))
+    valuation = value_table(main.nutmeg_table())
+    assert valuation.nav[0] == pytest.approx(1000.0)
+    assert valuation.nav[1] == pytest.approx(1000.0)
+    assert valuation.nav[-1] == pytest.approx(1100.0)
+    assert valuation.cash[1] == pytest.approx(0.0)
+    assert valuation.twr() == pytest.approx(0.1)
+    assert valuation.mwr() == pytest.approx(0.1, abs=1e-3)
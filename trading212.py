@@ -1,138 +1,259 @@
-import csv
+import argparse
 import os
-from datetime import datetime
-from pprint import pprint
-from dateutil import parser
-from transaction import Transaction
-import uuid
-
-# Create a list to store all transactions
-share_transactions = []
-cash_transactions = []
+from brokers import read_batches, read_file, transactions_from_batches
+from columnar import pa, read_columnar, write_columnar
+from dedupe import SeenIndex, dedupe_table
+from incremental import convert_incremental
+from instrumentation import add_arguments, configure_from_args, instrumentation, stage
+from ledger import Ledger
+from parallel import map_files
+from streaming import stream_convert
+from trading212_export import adapter
+from transaction import Transaction, report_unknown_types
+from transaction_table import TransactionTable
+from writers import trading212_target, write_targets, yahoo_target
 
 # Define the input folder path
 input_folder = "/Users/jakub/Development/portfolio-tracker/input"
 
-# List all CSV files in the input folder that start with "TRADING212"
-input_files = [
-    filename
-    for filename in os.listdir(input_folder)
-    if filename.startswith("TRADING212") and filename.endswith(".csv")
-]
-
-# Iterate through the CSV files and append their transactions to the list
-# This will import the deposits, withdrawals and dividends too, but, for better
-# cash management, in the next step we will introduce a list of cash transactions
-# derived from buying and selling events. In this way we will have a full history
-# of all money that went in and out of the account.
-for csv_file in input_files:
-    file_path = os.path.join(input_folder, csv_file)
-    with open(file_path, newline="") as csvfile:
-        reader = csv.DictReader(csvfile)
-        for row in reader:
-            transaction = Transaction(
-                date=row["Time"],
-                type=row["Action"],
-                ticker=row["Ticker"],
-                share_price=row["Price / share"],
-                share_amount=row["No. of shares"],
-                source_currency=row["Currency (Price / share)"],
-                target_currency=row["Currency (Total)"],
-                exchange_rate=row["Exchange rate"],
-                total=row["Total"],
-            )
+# Define the output CSV file path
+output_csv_file = "/Users/jakub/Development/portfolio-tracker/output/trading212.csv"
+yahoo_csv_file = "/Users/jakub/Development/portfolio-tracker/output/yahoo.csv"
+dedupe_report_file = "/Users/jakub/Development/portfolio-tracker/output/dedupe_report.json"
+manifest_file = "/Users/jakub/Development/portfolio-tracker/output/manifest.json"
 
-            transaction.compute_total_fee(row["Currency conversion fee"])
-            share_transactions.append(transaction)
+# Set to a file path to remember transaction IDs between runs
+seen_index_file = None
+# Set to a .parquet or .arrow path to also write the transactions there
+columnar_file = None
+# Set to an SQLite file to also add the transactions to a ledger
+ledger_file = None
 
-for transaction in share_transactions:
-    if transaction.action == "BUY":
-        cash_transactions.append(
-            Transaction(
+
+# Reading the exports imports the deposits, withdrawals and dividends too, but,
+# for better cash management, in the next step we will introduce a list of cash
+# transactions derived from buying and selling events. In this way we will have
+# a full history of all money that went in and out of the account.
+def derive_cash_transactions(share_transactions):
+    # The cash side of every trade. Exports without fee columns (Nutmeg)
+    # have no fee.
+    for transaction in share_transactions:
+        fee = transaction.fee or 0.0
+        if transaction.action == "BUY":
+            yield Transaction(
                 type="Withdrawal (share purchase)",
                 ticker=transaction.ticker,
-                total=transaction.total - transaction.fee,
-                date=transaction.date,
+                total=transaction.total - fee,
+                date=transaction.timestamp,
             )
-        )
-    elif transaction.action == "SELL":
-        cash_transactions.append(
-            Transaction(
+        elif transaction.action == "SELL":
+            yield Transaction(
                 type="Deposit (share sale)",
                 ticker=transaction.ticker,
-                total=-transaction.total + transaction.fee,
-                date=transaction.date,
+                total=-transaction.total + fee,
+                date=transaction.timestamp,
             )
-        )
-    if transaction.fee:
-        cash_transactions.append(
-            Transaction(
+        if fee:
+            yield Transaction(
                 type="Fee",
                 ticker=transaction.ticker,
-                total=transaction.fee,
-                date=transaction.date,
+                total=fee,
+                date=transaction.timestamp,
             )
+
+
+def convert_file(file_path, parse_time=None):
+    # Returns the share transactions of one export and the cash transactions
+    # derived from them
+    with stage("read") as current:
+        batches = read_batches(adapter, file_path)
+        current.rows = sum(map(len, batches))
+    with stage("transform") as current:
+        share_transactions = TransactionTable.from_transactions(
+            transactions_from_batches(adapter, batches, parse_time)
+        )
+        current.rows = len(share_transactions)
+    del batches
+    with stage("derive_cash") as current:
+        cash_transactions = TransactionTable.from_transactions(
+            derive_cash_transactions(share_transactions)
         )
+        current.rows = len(cash_transactions)
+    return cash_transactions, share_transactions
 
-# Combine the share and cash transactions into one list
-all_transactions = cash_transactions + share_transactions
-all_transactions.sort(key=lambda transaction: parser.parse(transaction.date))
 
-unique_ids = []  # To store unique transaction IDs
-unique_transactions = []  # To store unique transactions
-dupes = []
-duped_ids = []
+def combine(cash_tables, share_tables, seen_index=None):
+    # Combines the share and cash transactions into one date sorted table and
+    # drops the dupes. Returns the table and the DedupeReport.
+    with stage("sort") as current:
+        all_transactions = TransactionTable.concat(
+            *cash_tables, *share_tables
+        ).sort_by_date()
+        current.rows = len(all_transactions)
 
-for transaction in all_transactions:
-    if transaction.id not in unique_ids:
-        # If the identifier is not in the set, this is a unique transaction
-        unique_ids.append(transaction.id)
-        unique_transactions.append(transaction)
-        continue
-    duped_ids.append(transaction.id)
-    dupes.append(transaction)
-    print(transaction.id)
+    with stage("dedupe") as current:
+        current.rows = len(all_transactions)
+        return dedupe_table(all_transactions, seen_index)
 
-all_transactions = unique_transactions
 
-for dupe in dupes:
-    pprint(vars(dupe))
+def finish(cash_tables, share_tables, append=False):
+    seen_index = SeenIndex(seen_index_file) if seen_index_file else None
+    all_transactions, dedupe_report = combine(cash_tables, share_tables, seen_index)
+    if seen_index is not None:
+        seen_index.close()
+    dedupe_report.write(dedupe_report_file)
+    cash_rows = sum(len(table) for table in cash_tables)
 
+    print(f"{len(dedupe_report.dupes)} dupes (details in {dedupe_report_file})")
+    report_unknown_types(all_transactions.value_counts("type"))
+    if dedupe_report.new_indices is not None:
+        print(f"{len(dedupe_report.new_indices)} transactions not seen in previous runs")
+    print(
+        f"Converted {len(all_transactions)} Trading212 transactions (incl. {cash_rows} cash transactions)"
+    )
 
-print(f"{len(dupes)} dupes")
-print(
-    f"Converted {len(all_transactions)} Trading212 transactions (incl. {len(cash_transactions)} cash transactions)"
-)
+    write_outputs(all_transactions, append)
+    if columnar_file:
+        write_columnar_file(all_transactions, append)
+    return dedupe_report
 
-# Define the output CSV file path
-output_csv_file = "/Users/jakub/Development/portfolio-tracker/output/trading212.csv"
-yahoo_csv_file = "/Users/jakub/Development/portfolio-tracker/output/yahoo.csv"
 
-# Write the repeated transactions to the output CSV file
-with open(output_csv_file, "w", newline="") as csvfile:
-    fieldnames = vars(all_transactions[0])
-    writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-    writer.writeheader()
-
-    for transaction in all_transactions:
-        writer.writerow(vars(transaction))
-
-
-# Write the repeated transactions to the output CSV file
-with open(yahoo_csv_file, "w", newline="") as csvfile:
-    fieldnames = [
-        "Symbol",
-        "Date",
-        "Time",
-        "Trade Date",
-        "Purchase Price",
-        "Quantity",
-        "Comment",
-    ]
-    writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-    writer.writeheader()
-
-    for transaction in all_transactions:
-        item = transaction.convert_to_yahoo_format()
-
-        writer.writerow(item)
+def write_columnar_file(all_transactions, append=False):
+    with stage("write_columnar") as current:
+        if append:
+            all_transactions = TransactionTable.concat(
+                read_columnar(columnar_file), all_transactions
+            )
+        current.rows = len(all_transactions)
+        write_columnar(all_transactions, columnar_file)
+
+
+def output_targets():
+    return [trading212_target(output_csv_file), yahoo_target(yahoo_csv_file)]
+
+
+def write_outputs(all_transactions, append=False):
+    # Both files are written in one pass over the transactions
+    with stage("write") as current:
+        current.rows = len(all_transactions)
+        write_targets(all_transactions, output_targets(), append)
+
+
+def convert(input_files, jobs=1):
+    with stage("parse_files"):
+        tables = map_files(
+            convert_file,
+            [os.path.join(input_folder, csv_file) for csv_file in input_files],
+            jobs,
+        )
+    if ledger_file:
+        add_to_ledger(input_files, tables)
+    finish([cash for cash, _ in tables], [share for _, share in tables])
+
+
+def add_to_ledger(input_files, tables):
+    # Cash rows go in first, in the order finish() sorts them in
+    with stage("ledger") as current, Ledger(ledger_file) as ledger:
+        current.rows = ledger.add(
+            [(name, cash) for name, (cash, _) in zip(input_files, tables)]
+            + [(name, share) for name, (_, share) in zip(input_files, tables)]
+        )
+
+
+def convert_changed(input_files, jobs=1):
+    # Only exports that are new or modified since the last run are parsed
+    output_files = [output_csv_file, yahoo_csv_file]
+    if columnar_file:
+        # A missing columnar file makes this a full rebuild, not an append
+        output_files.append(columnar_file)
+    report = convert_incremental(
+        input_folder,
+        input_files,
+        output_files,
+        manifest_file,
+        convert_file,
+        finish,
+        jobs,
+    )
+    if report is None:
+        print("Trading212 outputs are up to date")
+
+
+def convert_streaming(input_files):
+    # Each export is read lazily and merged by date, so memory use doesn't
+    # grow with the length of the history. Exports must be in date order.
+    parse_time = adapter.date_parser()
+    sources = {
+        csv_file: read_file(adapter, os.path.join(input_folder, csv_file), parse_time)
+        for csv_file in input_files
+    }
+    with stage("stream") as current:
+        dedupe_report, type_counts = stream_convert(
+            sources, derive_cash_transactions, output_targets()
+        )
+        current.rows = dedupe_report.total
+    dedupe_report.write(dedupe_report_file)
+
+    print(f"{len(dedupe_report.dupes)} dupes (details in {dedupe_report_file})")
+    report_unknown_types(type_counts)
+    print(f"Converted {dedupe_report.unique} Trading212 transactions")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert Trading212 exports")
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="merge date-ordered exports on the fly with constant memory use",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="only convert exports added or changed since the last run",
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=1,
+        help="number of processes used to parse exports (default: 1)",
+    )
+    parser.add_argument(
+        "--ledger",
+        metavar="PATH",
+        help="also add the transactions to this SQLite ledger (not with --stream"
+        " or --incremental)",
+    )
+    parser.add_argument(
+        "--columnar",
+        metavar="PATH",
+        help="also write the transactions to a .parquet or .arrow file (needs pyarrow)",
+    )
+    parser.add_argument(
+        "--seen-index",
+        metavar="PATH",
+        help="SQLite file of IDs from earlier runs; reports and records the new"
+        " rows (not with --stream)",
+    )
+    add_arguments(parser)
+    args = parser.parse_args()
+    if args.columnar and args.stream:
+        parser.error("--columnar can't be combined with --stream")
+    if args.seen_index and args.stream:
+        parser.error("--seen-index can't be combined with --stream")
+    if args.ledger and (args.stream or args.incremental):
+        parser.error("--ledger only works with full conversions")
+    if args.columnar and pa is None:
+        parser.error("--columnar needs pyarrow (pip install pyarrow)")
+    configure_from_args(args)
+    columnar_file = args.columnar
+    ledger_file = args.ledger
+    seen_index_file = args.seen_index
+
+    input_files = adapter.list_files(input_folder)
+    if args.stream:
+        convert_streaming(input_files)
+    elif args.incremental:
+        convert_changed(input_files, args.jobs)
+    else:
+        convert(input_files, args.jobs)
+    instrumentation.finish()
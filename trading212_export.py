@@ -0,0 +1,25 @@
+from brokers import BrokerAdapter, register
+
+# Kept apart from trading212.py, which imports the whole conversion pipeline,
+# so finding the exports in a folder stays cheap
+adapter = register(
+    BrokerAdapter(
+        "trading212",
+        broker="Trading212",
+        prefix="TRADING212",
+        date_column="Time",
+        columns={
+            "type": "Action",
+            "ticker": "Ticker",
+            "share_price": "Price / share",
+            "share_amount": "No. of shares",
+            "source_currency": "Currency (Price / share)",
+            "target_currency": "Currency (Total)",
+            "exchange_rate": "Exchange rate",
+            "total": "Total",
+        },
+        # Trading212 writes ISO timestamps, some with fractional seconds
+        date_formats=[None],
+        fee_columns=["Currency conversion fee"],
+    )
+)
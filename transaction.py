@@ -1,6 +1,10 @@
 import hashlib
-from dateutil import parser
-from datetime import datetime
+from collections import namedtuple
+from functools import lru_cache
+from operator import attrgetter
+from dates import parse_date
+from ids import row_digest
+from instruments import instrument_for, yahoo_symbol
 
 cash_keywords = [
     "dividend",
@@ -13,13 +17,126 @@ cash_keywords = [
     "monthly deposit",
 ]
 withdrawal_keywords = ["withdrawal", "withdrawal (share purchase)", "fee"]
+# Money the owner moved into or out of an account, as opposed to cash earned
+# or spent inside it (dividends, interest, share purchases and sales)
+external_flow_keywords = ["deposit", "monthly deposit", "withdrawal"]
 buy_keywords = ["market buy", "purchase"]
 sell_keywords = ["market sell", "sale"]
 
-us_stocks = ["AAPL", "MRNA", "BB", "GME", "BYND", "KODK"]
+# What a transaction type means: its action, whether it takes money or shares
+# out of the account, and whether it is a cash (or fee) movement. Every type
+# shares one Kind instance with all other types of the same meaning.
+Kind = namedtuple("Kind", ["action", "negative", "cash", "fee"])
+
+buy_kind = Kind("BUY", False, False, False)
+sell_kind = Kind("SELL", True, False, False)
+cash_kind = Kind("CASH", False, True, False)
+withdrawal_kind = Kind("CASH", True, True, False)
+fee_kind = Kind("CASH", True, True, True)
+unknown_kind = Kind("", False, False, False)
+
+
+def build_kinds():
+    kinds = {}
+    for keyword in buy_keywords:
+        kinds[keyword] = buy_kind
+    for keyword in sell_keywords:
+        kinds[keyword] = sell_kind
+    for keyword in cash_keywords:
+        kinds[keyword] = cash_kind
+    for keyword in withdrawal_keywords:
+        kinds[keyword] = fee_kind if keyword == "fee" else withdrawal_kind
+    return kinds
+
+
+kinds = build_kinds()
+
+
+@lru_cache(maxsize=None)
+def classify(type):
+    return kinds.get(type.lower(), unknown_kind)
+
+
+def find_unknown_types(type_counts):
+    # Takes {type: count} and returns the types none of the keywords match
+    return {
+        type: count
+        for type, count in type_counts.items()
+        if classify(type) is unknown_kind
+    }
+
+
+def is_external_flow(type):
+    return type.lower() in external_flow_keywords
+
+
+def report_unknown_types(type_counts):
+    for type, count in find_unknown_types(type_counts).items():
+        print(f"Unknown transaction type {type!r} ({count} rows) was not classified")
+
+# Fields written out to trading212.csv
+csv_fields = [
+    "date",
+    "action",
+    "type",
+    "ticker",
+    "original_ticker",
+    "share_amount",
+    "share_price",
+    "source_currency",
+    "target_currency",
+    "exchange_rate",
+    "fee",
+    "total",
+    "comment",
+    "unencoded",
+    "id",
+]
+
+csv_row = attrgetter(*csv_fields)
+
+# Columns of the Yahoo Finance portfolio import format
+yahoo_fields = [
+    "Symbol",
+    "Date",
+    "Time",
+    "Trade Date",
+    "Purchase Price",
+    "Quantity",
+    "Comment",
+]
+
+
+def parse_rate(value):
+    # Exchange rates can be missing or "Not available" in broker exports
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
 
 
 class Transaction:
+    # comment, unencoded and the ID are only worked out when first read, which
+    # for most rows (dupes, rows going straight into a table) is never
+    __slots__ = (
+        "timestamp",
+        "date",
+        "action",
+        "type",
+        "ticker",
+        "original_ticker",
+        "share_amount",
+        "share_price",
+        "source_currency",
+        "target_currency",
+        "exchange_rate",
+        "fee",
+        "total",
+        "_comment",
+        "_unencoded",
+        "_digest",
+    )
+
     def __init__(
         self,
         date=None,
@@ -35,7 +152,9 @@ class Transaction:
         total=None,
         comment=None,
     ):
-        self.date = parser.parse(date).isoformat()
+        # date can be a string or an already parsed datetime
+        self.timestamp = parse_date(date)
+        self.date = self.timestamp.isoformat()
         self.action = ""
         self.type = type
         self.ticker = ticker
@@ -44,67 +163,112 @@ class Transaction:
         self.share_price = float(share_price) if share_price else 0.0
         self.source_currency = source_currency
         self.target_currency = target_currency
-        self.exchange_rate = exchange_rate
+        self.exchange_rate = parse_rate(exchange_rate)
         self.fee = fee
         self.total = float(total)
-        self.comment = comment
+        self._comment = comment or None
+        self._unencoded = None
+        self._digest = None
 
-        if self.is_purchase():
-            self.action = "BUY"
-        elif self.is_sale():
-            self.action = "SELL"
-        elif self.is_cash():
+        kind = classify(self.type)
+        self.action = kind.action
+        if kind.cash:
             self.set_cash_props()
 
-        if self.is_fee():
+        if kind.fee:
             self.share_amount = self.total
 
-        if self.is_negative():
+        if kind.negative:
             self.share_amount = -self.share_amount
             self.total = -self.total
 
-        if not self.is_us_stock() and not self.is_cash():
-            self.ticker = self.ticker + ".L"
+        # Tickers are kept as Yahoo symbols, e.g. VUSA.L for a London listing
+        if not kind.cash:
+            self.ticker = yahoo_symbol(self.ticker)
+
+    @classmethod
+    def from_fields(cls, comment=None, digest=None, **fields):
+        # Rebuild an already normalised transaction (e.g. from a TransactionTable)
+        # without running __init__, which would flip signs and add suffixes again
+        transaction = cls.__new__(cls)
+        for name, value in fields.items():
+            setattr(transaction, name, value)
+        transaction._comment = comment
+        transaction._unencoded = None
+        transaction._digest = digest
+        return transaction
+
+    @property
+    def comment(self):
+        if self._comment is None:
+            self._comment = self.default_comment()
+        return self._comment
+
+    @comment.setter
+    def comment(self, comment):
+        self._comment = comment or None
 
-        if not self.comment:
-            self.comment = f"{self.type} - {abs(self.share_amount)} {self.ticker} @ {self.share_price} on {self.date}"
+    def has_default_comment(self):
+        return self._comment is None or self._comment == self.default_comment()
 
-        self.id = self.compute_id()
+    @property
+    def unencoded(self):
+        if self._unencoded is None:
+            self._unencoded = self.canonical_string()
+        return self._unencoded
+
+    @property
+    def digest(self):
+        # Raw 16 byte digest of the packed fields (see ids.py), id is its hex
+        # form
+        if self._digest is None:
+            self._digest = row_digest(
+                self.timestamp,
+                self.action,
+                self.type,
+                self.ticker,
+                self.original_ticker,
+                (self.share_amount, self.share_price, self.total),
+            )
+        return self._digest
+
+    @property
+    def legacy_digest(self):
+        # The ID before binary IDs: MD5 of the canonical string. Only used to
+        # migrate stored IDs (see migrate_ids.py).
+        return hashlib.md5(self.unencoded.encode()).digest()
+
+    @property
+    def id(self):
+        return self.digest.hex()
+
+    def to_dict(self):
+        return {field: getattr(self, field) for field in csv_fields}
+
+    def default_comment(self):
+        return f"{self.type} - {abs(self.share_amount)} {self.ticker} @ {self.share_price} on {self.date}"
+
+    @property
+    def kind(self):
+        return classify(self.type)
 
     def is_cash(self):
-        if self.type.lower() in cash_keywords + withdrawal_keywords:
-            return True
-        return False
+        return self.kind.cash
 
     def is_fee(self):
-        if self.type.lower() == "fee":
-            return True
-        return False
+        return self.kind.fee
 
     def is_purchase(self):
-        if self.type.lower() in buy_keywords:
-            return True
-        return False
+        return self.kind is buy_kind
 
     def is_sale(self):
-        if self.type.lower() in sell_keywords:
-            return True
-        return False
+        return self.kind is sell_kind
 
     def is_us_stock(self):
-        if self.ticker in us_stocks:
-            return True
-        return False
+        return instrument_for(self.ticker).currency == "USD"
 
     def is_negative(self):
-        if self.is_cash():
-            if self.type.lower() in withdrawal_keywords:
-                return True
-            return False
-        else:
-            if self.type.lower() in sell_keywords:
-                return True
-            return False
+        return self.kind.negative
 
     def set_cash_props(self):
         self.action = "CASH"
@@ -115,27 +279,35 @@ class Transaction:
         self.share_price = 1.0
         self.share_amount = self.total
 
+    def canonical_string(self):
+        return f"{self.date}-{self.ticker}-{self.total}-{self.type}-{self.share_amount}-{self.share_price}-{self.action}-{self.original_ticker}"
+
     def compute_id(self):
-        data = f"{self.date}-{self.ticker}-{self.total}-{self.type}-{self.share_amount}-{self.share_price}-{self.action}-{self.original_ticker}"
-        self.unencoded = data
-        return hashlib.md5(data.encode()).hexdigest()
+        return self.id
 
     def compute_total_fee(self, *fees):
-        self.fee = 0
+        self.fee = 0.0
         for fee_arg in fees:
             if fee_arg:
                 self.fee += float(fee_arg)
         return self.fee
 
     def convert_to_yahoo_format(self):
-        item = dict()
+        return dict(zip(yahoo_fields, self.yahoo_row()))
 
-        item["Date"] = datetime.fromisoformat(self.date).strftime("%d/%m/%Y")
-        item["Time"] = datetime.fromisoformat(self.date).strftime("%H:%M") + " BST"
-        item["Trade Date"] = datetime.fromisoformat(self.date).strftime("%Y%m%d")
-        item["Comment"] = self.comment
-        item["Symbol"] = self.ticker
-        item["Purchase Price"] = self.share_price
-        item["Quantity"] = self.share_amount
+    def to_row(self):
+        # Values of csv_fields, in order
+        return csv_row(self)
 
-        return item
+    def yahoo_row(self):
+        # Values of yahoo_fields, in order
+        timestamp = self.timestamp
+        return (
+            self.ticker,
+            f"{timestamp.day:02}/{timestamp.month:02}/{timestamp.year:04}",
+            f"{timestamp.hour:02}:{timestamp.minute:02} BST",
+            f"{timestamp.year:04}{timestamp.month:02}{timestamp.day:02}",
+            self.share_price,
+            self.share_amount,
+            self.comment,
+        )
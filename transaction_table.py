@@ -0,0 +1,241 @@
+import json
+from array import array
+
+import numpy as np
+
+from dates import from_epoch, to_epoch
+from ids import table_ids
+from transaction import Transaction
+
+# Repetitive string columns are stored as int32 codes into a per-column list
+# of distinct values, numeric columns as float64 (NaN where the field is empty)
+categorical_columns = [
+    "action",
+    "type",
+    "ticker",
+    "original_ticker",
+    "source_currency",
+    "target_currency",
+]
+numeric_columns = ["share_amount", "share_price", "exchange_rate", "fee", "total"]
+
+
+def to_float(value):
+    if value is None or value == "":
+        return np.nan
+    try:
+        return float(value)
+    except ValueError:
+        return np.nan
+
+
+def from_float(value):
+    return None if np.isnan(value) else float(value)
+
+
+class TransactionTable:
+    def __init__(self, dates, codes, categories, numbers, comments, ids):
+        self.dates_epoch = dates  # int64 microseconds since 1970-01-01
+        self.codes = codes
+        self.categories = categories
+        self.numbers = numbers
+        self.comments = comments  # None where the comment is the default one
+        self.ids = ids  # raw 16 byte digests, see ids.py
+
+    @classmethod
+    def from_transactions(cls, transactions):
+        # Columns are accumulated in compact arrays so the Transaction objects
+        # can be dropped as soon as they have been read
+        dates = array("q")
+        codes = {name: array("i") for name in categorical_columns}
+        lookups = {name: {} for name in categorical_columns}
+        numbers = {name: array("d") for name in numeric_columns}
+        comments = []
+
+        for transaction in transactions:
+            dates.append(to_epoch(transaction.timestamp))
+            for name in categorical_columns:
+                lookup = lookups[name]
+                value = getattr(transaction, name)
+                code = lookup.get(value)
+                if code is None:
+                    code = lookup[value] = len(lookup)
+                codes[name].append(code)
+            for name in numeric_columns:
+                numbers[name].append(to_float(getattr(transaction, name)))
+            if transaction.has_default_comment():
+                comments.append(None)
+            else:
+                comments.append(transaction.comment)
+
+        dates = np.frombuffer(dates, dtype=np.int64)
+        codes = {name: np.frombuffer(codes[name], dtype=np.int32) for name in codes}
+        categories = {name: list(lookups[name]) for name in lookups}
+        numbers = {
+            name: np.frombuffer(numbers[name], dtype=np.float64) for name in numbers
+        }
+        # IDs are hashed for the whole table at once rather than per row
+        return cls(
+            dates,
+            codes,
+            categories,
+            numbers,
+            np.array(comments, dtype=object),
+            table_ids(dates, codes, categories, numbers),
+        )
+
+    @classmethod
+    def concat(cls, *tables):
+        if not tables:
+            return cls.from_transactions([])
+        codes = {}
+        categories = {}
+        for name in categorical_columns:
+            lookup = {}
+            parts = []
+            for table in tables:
+                mapping = np.array(
+                    [lookup.setdefault(value, len(lookup)) for value in table.categories[name]],
+                    dtype=np.int32,
+                )
+                parts.append(mapping[table.codes[name]])
+            codes[name] = np.concatenate(parts)
+            categories[name] = list(lookup)
+
+        return cls(
+            np.concatenate([table.dates_epoch for table in tables]),
+            codes,
+            categories,
+            {
+                name: np.concatenate([table.numbers[name] for table in tables])
+                for name in numeric_columns
+            },
+            np.concatenate([table.comments for table in tables]),
+            np.concatenate([table.ids for table in tables]),
+        )
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(
+                data["date"],
+                {name: data[f"code_{name}"] for name in categorical_columns},
+                json.loads(str(data["categories"])),
+                {name: data[f"number_{name}"] for name in numeric_columns},
+                np.array(json.loads(str(data["comments"])), dtype=object),
+                data["id"].view("V16"),
+            )
+
+    def save(self, path):
+        # Strings are stored as JSON so the file can be loaded without pickle
+        np.savez(
+            path,
+            date=self.dates_epoch,
+            categories=np.array(json.dumps(self.categories)),
+            comments=np.array(json.dumps(self.comments.tolist())),
+            id=self.ids.view(np.uint8),
+            **{f"code_{name}": codes for name, codes in self.codes.items()},
+            **{f"number_{name}": numbers for name, numbers in self.numbers.items()},
+        )
+
+    def __len__(self):
+        return len(self.dates_epoch)
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self.transaction(index)
+
+    def take(self, indices):
+        return TransactionTable(
+            self.dates_epoch[indices],
+            {name: codes[indices] for name, codes in self.codes.items()},
+            self.categories,
+            {name: numbers[indices] for name, numbers in self.numbers.items()},
+            self.comments[indices],
+            self.ids[indices],
+        )
+
+    def sort_by_date(self):
+        return self.take(np.argsort(self.dates_epoch, kind="stable"))
+
+    def filter(self, action=None, ticker=None, start=None, end=None):
+        # Date range is half open: start <= date < end
+        mask = np.ones(len(self), dtype=bool)
+        if action is not None:
+            mask &= self.isin("action", action)
+        if ticker is not None:
+            mask &= self.isin("ticker", ticker)
+        if start is not None:
+            mask &= self.dates_epoch >= to_epoch(start)
+        if end is not None:
+            mask &= self.dates_epoch < to_epoch(end)
+        return self.take(np.flatnonzero(mask))
+
+    def isin(self, name, values):
+        if isinstance(values, str):
+            values = [values]
+        categories = self.categories[name]
+        wanted = [code for code, value in enumerate(categories) if value in values]
+        return np.isin(self.codes[name], wanted)
+
+    def value_counts(self, name):
+        counts = np.bincount(self.codes[name], minlength=len(self.categories[name]))
+        return {
+            value: int(count)
+            for value, count in zip(self.categories[name], counts)
+            if count
+        }
+
+    def decode(self, name):
+        return np.array(self.categories[name], dtype=object)[self.codes[name]]
+
+    @property
+    def dates(self):
+        return self.dates_epoch.view("datetime64[us]")
+
+    @property
+    def actions(self):
+        return self.decode("action")
+
+    @property
+    def types(self):
+        return self.decode("type")
+
+    @property
+    def tickers(self):
+        return self.decode("ticker")
+
+    @property
+    def share_amounts(self):
+        return self.numbers["share_amount"]
+
+    @property
+    def share_prices(self):
+        return self.numbers["share_price"]
+
+    @property
+    def fees(self):
+        return self.numbers["fee"]
+
+    @property
+    def totals(self):
+        return self.numbers["total"]
+
+    def transaction(self, index):
+        timestamp = from_epoch(self.dates_epoch[index])
+        fields = {"timestamp": timestamp, "date": timestamp.isoformat()}
+        for name in ["action", "type", "ticker", "original_ticker"]:
+            fields[name] = self.categories[name][self.codes[name][index]]
+        fields["share_amount"] = float(self.numbers["share_amount"][index])
+        fields["share_price"] = float(self.numbers["share_price"][index])
+        for name in ["source_currency", "target_currency"]:
+            fields[name] = self.categories[name][self.codes[name][index]]
+        fields["exchange_rate"] = from_float(self.numbers["exchange_rate"][index])
+        fields["fee"] = from_float(self.numbers["fee"][index])
+        fields["total"] = float(self.numbers["total"][index])
+        fields["comment"] = self.comments[index]
+        fields["digest"] = self.ids[index].tobytes()
+        return Transaction.from_fields(**fields)
+
+    def to_transactions(self):
+        return list(self)
@@ -0,0 +1,261 @@
+import numpy as np
+
+from dates import MICROSECONDS_PER_DAY, to_epoch
+from fx import account_currency
+from instruments import resolve
+from pnl import gbp_amounts, row_rates
+from transaction import is_external_flow
+
+days_per_year = 365.0
+
+
+def day_numbers(epochs):
+    # Days since 1970-01-01, the unit of every valuation series
+    return np.asarray(epochs) // MICROSECONDS_PER_DAY
+
+
+def as_of(event_days, values, days):
+    # Latest value on or before each day, NaN before the first one
+    index = np.searchsorted(event_days, days, side="right") - 1
+    return np.where(index >= 0, values[np.maximum(index, 0)], np.nan)
+
+
+class Valuation:
+    # Daily end-of-day state of one portfolio: shares held (days x tickers),
+    # their GBP prices, the cash balance and the external flows (deposits
+    # positive, withdrawals negative) of each day
+    def __init__(self, days, tickers, holdings, prices, cash, flows):
+        self.days = days
+        self.tickers = tickers
+        self.holdings = holdings
+        self.prices = prices
+        self.cash = cash
+        self.flows = flows
+
+    def __len__(self):
+        return len(self.days)
+
+    @property
+    def dates(self):
+        return self.days.astype("datetime64[D]")
+
+    @property
+    def values(self):
+        # Days before a ticker's first known price count as worth nothing
+        return np.nan_to_num(self.holdings * self.prices)
+
+    @property
+    def nav(self):
+        return self.cash + self.values.sum(axis=1)
+
+    def daily_returns(self):
+        # Flows are taken to arrive at the start of their day, so a day's
+        # return is its closing value over the previous close plus the flow
+        nav = self.nav
+        start = nav[:-1] + self.flows[1:]
+        valid = start > 1e-9
+        returns = np.zeros(len(nav))
+        returns[1:][valid] = nav[1:][valid] / start[valid] - 1.0
+        return returns
+
+    def twr(self, annualised=False):
+        growth = np.prod(1.0 + self.daily_returns())
+        if annualised and len(self) > 1:
+            return growth ** (days_per_year / (len(self) - 1)) - 1.0
+        return growth - 1.0
+
+    def mwr(self):
+        # XIRR of the owner's cash flows: the opening value goes in on the
+        # first day, later deposits go in and withdrawals come out, and the
+        # closing value comes back out on the last day
+        nav = self.nav
+        amounts = -self.flows.astype(np.float64)
+        amounts[0] = -nav[0]
+        amounts[-1] += nav[-1]
+        keep = amounts != 0
+        years = (self.days[keep] - self.days[0]) / days_per_year
+        return xirr(years, amounts[keep])
+
+    @classmethod
+    def combine(cls, valuations):
+        # Sum of portfolios valued over the same days; a ticker held in more
+        # than one of them gets one column
+        valuations = list(valuations)
+        days = valuations[0].days
+        tickers = sorted(
+            {ticker for valuation in valuations for ticker in valuation.tickers}
+        )
+        column = {ticker: index for index, ticker in enumerate(tickers)}
+        holdings = np.zeros((len(days), len(tickers)))
+        prices = np.full((len(days), len(tickers)), np.nan)
+        cash = np.zeros(len(days))
+        flows = np.zeros(len(days))
+        for valuation in valuations:
+            if not np.array_equal(valuation.days, days):
+                raise ValueError("Valuations cover different days")
+            columns = [column[ticker] for ticker in valuation.tickers]
+            holdings[:, columns] += valuation.holdings
+            prices[:, columns] = np.where(
+                np.isnan(prices[:, columns]), valuation.prices, prices[:, columns]
+            )
+            cash += valuation.cash
+            flows += valuation.flows
+        return cls(days, tickers, holdings, prices, cash, flows)
+
+
+def trade_prices(table, rates=None):
+    # GBP price per share and exchange rate of every trade
+    shares = np.abs(table.share_amounts)
+    prices = np.divide(
+        gbp_amounts(table, rates),
+        shares,
+        out=np.full(len(table), np.nan),
+        where=shares > 0,
+    )
+    return prices, row_rates(table, rates)
+
+
+def value_days(table, store, days, rates=None):
+    first = days[0]
+    count = len(days)
+    row_days = day_numbers(table.dates_epoch)
+    in_range = row_days <= days[-1]
+    # Rows from before the first day make up its opening position
+    index = np.clip(row_days - first, 0, None)
+
+    trades = np.flatnonzero(in_range & table.isin("action", ["BUY", "SELL"]))
+    used, column = np.unique(table.codes["ticker"][trades], return_inverse=True)
+    tickers = [table.categories["ticker"][code] for code in used]
+    width = len(tickers)
+
+    # Holdings matrix: net shares traded per (day, ticker), summed over days
+    deltas = np.bincount(
+        index[trades] * width + column,
+        table.share_amounts[trades],
+        minlength=count * width,
+    )
+    holdings = np.cumsum(deltas.reshape(count, width), axis=0)
+
+    # Price matrix: stored closes where there are any, otherwise the last
+    # price the ticker traded at. Closes in other currencies than pounds are
+    # converted at the day's rate from the FX table, or without one at the
+    # rate of the latest trade.
+    prices = np.empty((count, width))
+    day_ends = (days + 1) * MICROSECONDS_PER_DAY - 1
+    trade_days = row_days[trades]
+    traded_prices, traded_rates = trade_prices(table.take(trades), rates)
+    instruments = resolve(tickers)
+    order = np.argsort(column, kind="stable")
+    starts = np.flatnonzero(np.diff(column[order], prepend=-1))
+    ends = np.append(starts[1:], len(order))
+    for number, (start, end) in enumerate(zip(starts, ends)):
+        ticker = tickers[number]
+        rows = order[start:end]
+        traded = as_of(trade_days[rows], traded_prices[rows], days)
+        if store is not None and ticker in store:
+            quoted = store.prices_at(ticker, day_ends)
+            currency = instruments[number].currency
+            if currency != account_currency:
+                daily_rates = None
+                if rates is not None:
+                    daily_rates = rates.rates_on(account_currency, currency, days)
+                if daily_rates is None:
+                    daily_rates = as_of(trade_days[rows], traded_rates[rows], days)
+                quoted = quoted / daily_rates
+            prices[:, number] = np.where(np.isnan(quoted), traded, quoted)
+        else:
+            prices[:, number] = traded
+
+    cash_rows = np.flatnonzero(in_range & table.isin("action", ["CASH"]))
+    cash = np.cumsum(
+        np.bincount(index[cash_rows], table.totals[cash_rows], minlength=count)
+    )
+    external = np.array(
+        [is_external_flow(type) for type in table.categories["type"]], dtype=bool
+    )
+    flow_rows = cash_rows[external[table.codes["type"][cash_rows]]]
+    flow_rows = flow_rows[row_days[flow_rows] >= first]
+    flows = np.bincount(index[flow_rows], table.totals[flow_rows], minlength=count)
+    return Valuation(days, tickers, holdings, prices, cash, flows)
+
+
+def day_range(tables, start=None, end=None):
+    dates = [table.dates_epoch for table in tables if len(table)]
+    if start:
+        first = day_numbers(to_epoch(start))
+    else:
+        first = min(day_numbers(table_dates.min()) for table_dates in dates)
+    if end:
+        last = day_numbers(to_epoch(end))
+    else:
+        last = max(day_numbers(table_dates.max()) for table_dates in dates)
+    return np.arange(first, last + 1, dtype=np.int64)
+
+
+def value_table(table, store=None, start=None, end=None, rates=None):
+    # Values a date sorted, deduplicated TransactionTable every day from start
+    # (default: its first transaction) to end (default: its last). rates is
+    # an fx.FxRates loaded once and shared with the P&L.
+    return value_days(table, store, day_range([table], start, end), rates)
+
+
+def value_portfolio(tables, store=None, start=None, end=None, rates=None):
+    # tables maps broker name to its TransactionTable. Returns a Valuation per
+    # broker plus their combined "total", all over the same days.
+    days = day_range(tables.values(), start, end)
+    valuations = {
+        name: value_days(table, store, days, rates) for name, table in tables.items()
+    }
+    valuations["total"] = Valuation.combine(valuations.values())
+    return valuations
+
+
+def xirr(
+    years,
+    amounts,
+    low=-0.9999,
+    high=100.0,
+    points=64,
+    tolerance=1e-12,
+    max_points=4096,
+):
+    # Annual rate r with sum(amounts / (1 + r) ** years) == 0. Works on
+    # g = log(1 + r): every round evaluates the present value at `points`
+    # rates at once and keeps the first interval where it changes sign, so
+    # the bracket shrinks by points - 1 per round; a Newton step finishes.
+    # Flows that change sign more than once can have several rates; the
+    # lowest one found is returned. Two roots inside one grid cell show no
+    # sign change, so a grid without one is refined up to max_points before
+    # giving up with NaN; roots closer together than that grid's cells
+    # (about 0.3% apart in g over the default range) are still missed.
+    years = np.asarray(years, dtype=np.float64)
+    amounts = np.asarray(amounts, dtype=np.float64)
+    if not (amounts > 0).any() or not (amounts < 0).any():
+        return np.nan
+
+    def present_value(growth):
+        return (amounts * np.exp(-np.multiply.outer(growth, years))).sum(axis=-1)
+
+    lower, upper = np.log1p(low), np.log1p(high)
+    grid_points = points
+    with np.errstate(over="ignore", invalid="ignore"):
+        while upper - lower > tolerance:
+            grid = np.linspace(lower, upper, grid_points)
+            values = present_value(grid)
+            changes = np.flatnonzero(np.sign(values[:-1]) * np.sign(values[1:]) <= 0)
+            if not len(changes):
+                if grid_points >= max_points:
+                    return np.nan
+                grid_points = min(grid_points * 8, max_points)
+                continue
+            lower, upper = grid[changes[0]], grid[changes[0] + 1]
+            grid_points = points
+
+        growth = (lower + upper) / 2
+        value = present_value(growth)
+        slope = -(amounts * years * np.exp(-growth * years)).sum()
+        if slope:
+            newton = growth - value / slope
+            if lower <= newton <= upper:
+                growth = newton
+    return float(np.expm1(growth))
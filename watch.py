@@ -0,0 +1,225 @@
+import argparse
+import os
+import time
+
+import main
+import trading212
+from brokers import adapter_for, convert_file, load_adapters
+from cli import add_input_argument, add_output_argument, configure_folders
+from instrumentation import add_arguments, configure_from_args, instrumentation, stage
+from transaction_table import TransactionTable
+
+# Seconds between scans of the input folder. A file is converted on the scan
+# after it stopped changing, so a new export is picked up within two of these.
+poll_interval = 0.2
+
+
+class FolderWatcher:
+    # Polls a folder for broker exports. Polling os.scandir works the same on
+    # macOS and Linux and costs one stat per export. A new or modified file is
+    # only reported once its size and mtime are the same on two scans in a
+    # row, so an export still being copied in isn't read half written.
+    def __init__(self, folder, matches):
+        self.folder = folder
+        self.matches = matches
+        self.known = {}  # name -> (size, mtime) of the files reported so far
+        self.pending = {}  # name -> (size, mtime) of files seen changing
+
+    def scan(self):
+        signatures = {}
+        with os.scandir(self.folder) as entries:
+            for entry in entries:
+                if not self.matches(entry.name):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                signatures[entry.name] = (stat.st_size, stat.st_mtime_ns)
+        return signatures
+
+    def poll(self):
+        # Returns the names of the files changed and removed since last time
+        signatures = self.scan()
+        changed = []
+        for name, signature in signatures.items():
+            if self.known.get(name) == signature:
+                self.pending.pop(name, None)
+            elif self.pending.get(name) == signature:
+                del self.pending[name]
+                self.known[name] = signature
+                changed.append(name)
+            else:
+                self.pending[name] = signature
+        removed = [name for name in self.known if name not in signatures]
+        for name in removed:
+            del self.known[name]
+        for name in [name for name in self.pending if name not in signatures]:
+            del self.pending[name]
+        return changed, removed
+
+
+class ExportError(Exception):
+    # A changed export that couldn't be converted; the cause is chained
+    def __init__(self, name):
+        super().__init__(name)
+        self.name = name
+
+
+def convert_export(convert, folder, name):
+    try:
+        return convert(os.path.join(folder, name))
+    except Exception as error:
+        raise ExportError(name) from error
+
+
+def first_date(tables):
+    dates = [table.dates_epoch.min() for table in tables if len(table)]
+    return min(dates) if dates else None
+
+
+def last_date(tables):
+    dates = [table.dates_epoch.max() for table in tables if len(table)]
+    return max(dates) if dates else None
+
+
+class Trading212State:
+    # The (cash, share) tables of every export, kept in memory so an update
+    # only parses the files that changed. The outputs are rebuilt from these
+    # with trading212.finish, or, when every changed file is new and all its
+    # rows come after the existing ones, only the new rows are appended.
+    def __init__(self):
+        self.tables = {}
+
+    def update(self, changed, removed):
+        for name in removed:
+            del self.tables[name]
+        with stage("parse_files"):
+            converted = {
+                name: convert_export(
+                    trading212.convert_file, trading212.input_folder, name
+                )
+                for name in changed
+            }
+        new_files = [name for name in changed if name not in self.tables]
+        previous_last = last_date(
+            table for name in self.tables for table in self.tables[name]
+        )
+        new_first = first_date(
+            table for name in new_files for table in converted[name]
+        )
+        appendable = (
+            previous_last is not None
+            and not removed
+            and len(new_files) == len(changed)
+            and (new_first is None or new_first > previous_last)
+            and os.path.exists(trading212.output_csv_file)
+            and os.path.exists(trading212.yahoo_csv_file)
+        )
+        self.tables.update(converted)
+
+        # Same file order as a one-off conversion of the folder
+        names = [
+            name
+            for name in trading212.adapter.list_files(trading212.input_folder)
+            if name in (new_files if appendable else self.tables)
+        ]
+        tables = [self.tables[name] for name in names]
+        trading212.finish(
+            [cash for cash, _ in tables], [share for _, share in tables], appendable
+        )
+
+
+class NutmegState:
+    # Nutmeg exports are small, so yahoo_nutmeg.csv is rewritten in full from
+    # the tables kept in memory
+    def __init__(self):
+        self.tables = {}
+
+    def update(self, changed, removed):
+        for name in removed:
+            del self.tables[name]
+        with stage("parse_files"):
+            for name in changed:
+                self.tables[name] = convert_export(
+                    convert_file, main.input_folder, name
+                )
+        tables = [
+            self.tables[name] for name in main.nutmeg_files() if name in self.tables
+        ]
+        all_transactions = TransactionTable.concat(*tables) if tables else []
+        print(f"{len(all_transactions)} total Nutmeg transactions")
+        with stage("write_yahoo") as current:
+            current.rows = len(all_transactions)
+            main.write_yahoo_nutmeg(all_transactions)
+
+
+def watch(interval=poll_interval):
+    adapters = load_adapters().values()
+    watcher = FolderWatcher(
+        trading212.input_folder,
+        lambda filename: any(adapter.matches(filename) for adapter in adapters),
+    )
+    states = {"Trading212": Trading212State(), "Nutmeg": NutmegState()}
+    print(f"Watching {trading212.input_folder} (Ctrl-C to stop)")
+    while True:
+        changed, removed = watcher.poll()
+        if not changed and not removed:
+            time.sleep(interval)
+            continue
+        for broker, state in states.items():
+            broker_changed = [
+                name for name in changed if adapter_for(name).broker == broker
+            ]
+            broker_removed = [
+                name for name in removed if adapter_for(name).broker == broker
+            ]
+            if not broker_changed and not broker_removed:
+                continue
+            start = time.perf_counter()
+            # A bad or half written export mustn't stop the watcher: the
+            # previous tables are kept and the file is retried once it changes
+            previous = dict(state.tables)
+            try:
+                with stage(f"update_{broker.lower()}"):
+                    state.update(broker_changed, broker_removed)
+            except ExportError as error:
+                state.tables = previous
+                print(
+                    f"Couldn't convert {error.name}, {broker} outputs not updated:"
+                    f" {error.__cause__!r}"
+                )
+                continue
+            except Exception as error:
+                state.tables = previous
+                print(f"Updating {broker} outputs failed: {error!r}")
+                continue
+            print(
+                f"Updated {broker} outputs in {time.perf_counter() - start:.2f}s"
+                f" ({len(broker_changed)} changed, {len(broker_removed)} removed)"
+            )
+        # Timings are reported per update
+        instrumentation.finish()
+        instrumentation.records.clear()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Convert broker exports as they are added to the input folder"
+    )
+    parser.add_argument(
+        "--interval",
+        type=float,
+        default=poll_interval,
+        help=f"seconds between scans of the input folder (default: {poll_interval})",
+    )
+    add_input_argument(parser)
+    add_output_argument(parser)
+    add_arguments(parser)
+    args = parser.parse_args()
+    configure_folders(args)
+    configure_from_args(args)
+    try:
+        watch(args.interval)
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,92 @@
+import csv
+import os
+import shutil
+
+from transaction import Transaction, csv_fields, yahoo_fields
+
+buffer_size = 1 << 20
+
+
+class Target:
+    # One output file: its header and how a transaction becomes a row (a
+    # tuple in header order)
+    def __init__(self, path, header, row):
+        self.path = path
+        self.header = header
+        self.row = row
+
+
+def trading212_target(path):
+    return Target(path, csv_fields, Transaction.to_row)
+
+
+def yahoo_target(path):
+    return Target(path, yahoo_fields, Transaction.yahoo_row)
+
+
+# Output formats by name; a new format only needs a function here returning
+# its Target, and is then written in the same pass as the others
+output_formats = {"trading212": trading212_target, "yahoo": yahoo_target}
+
+
+class OutputWriter:
+    # Writes every target in one pass over the transactions. Each target is
+    # written to a temporary file next to it and renamed over it on success,
+    # so an interrupted run leaves the previous outputs untouched. Appending
+    # starts from a copy of the existing file for the same reason.
+    def __init__(self, targets, append=False):
+        self.targets = list(targets)
+        self.append = append
+        self.files = []
+        self.writers = []
+
+    def __enter__(self):
+        try:
+            for target in self.targets:
+                temporary = target.path + ".tmp"
+                append = self.append and os.path.exists(target.path)
+                if append:
+                    shutil.copyfile(target.path, temporary)
+                file = open(
+                    temporary, "a" if append else "w", newline="", buffering=buffer_size
+                )
+                self.files.append((file, temporary, target.path))
+                writer = csv.writer(file)
+                if not append:
+                    writer.writerow(target.header)
+                self.writers.append((writer.writerow, target.row))
+        except BaseException:
+            self.discard()
+            raise
+        return self
+
+    def write(self, transaction):
+        for writerow, row in self.writers:
+            writerow(row(transaction))
+
+    def write_all(self, transactions):
+        writers = self.writers
+        for transaction in transactions:
+            for writerow, row in writers:
+                writerow(row(transaction))
+
+    def discard(self):
+        for file, temporary, _ in self.files:
+            file.close()
+            if os.path.exists(temporary):
+                os.remove(temporary)
+
+    def __exit__(self, exc_type, *exc_info):
+        if exc_type is not None:
+            self.discard()
+            return False
+        for file, _, _ in self.files:
+            file.close()
+        for _, temporary, path in self.files:
+            os.replace(temporary, path)
+        return False
+
+
+def write_targets(transactions, targets, append=False):
+    with OutputWriter(targets, append) as writer:
+        writer.write_all(transactions)